@@ -6,26 +6,23 @@ Usage: python Depository.py
 """
 
 import sys
-import time
+
+import depository_git as gitops
 from depository_core import (
     clear_screen, print_banner, print_token_status, section,
     check_for_update, get_repos, get_branches,
-    do_download, prompt_download_method, print_repo_list,
-    select_branches, prompt_continue_menu,
-    UPDATE_CHECK_INTERVAL, cleanup_pycache,
+    do_download_branches, prompt_download_method, print_repo_list,
+    select_branches, prompt_continue_menu, branch_sha,
+    cleanup_pycache,
 )
 
 
 def run():
     current_username = None
-    check_for_update()
-    last_check = time.time()
 
     while True:
-        # Periodic update re-check
-        if time.time() - last_check > UPDATE_CHECK_INTERVAL:
-            check_for_update()
-            last_check = time.time()
+        # Background update check; offered here once it has an answer
+        check_for_update()
 
         # ── Username prompt ───────────────────────────────────
         clear_screen()
@@ -103,14 +100,15 @@ def run():
                 continue
 
             print()
-            use_git = prompt_download_method()
+            method = prompt_download_method()
 
             # ── Download ──────────────────────────────────────
             section("Downloading")
-            results = {}
-            for branch in selected_branches:
-                ok = do_download(username, repo_name, branch, use_git)
-                results[branch] = ok
+            with gitops.tuned(1):
+                results = do_download_branches(
+                    username, repo_name,
+                    [(b, branch_sha(branches, b)) for b in selected_branches],
+                    method)
 
             # ── Summary ───────────────────────────────────────
             clear_screen()
@@ -3,22 +3,33 @@ MDepository.py  —  Download multiple GitHub repositories concurrently.
 Part of the Depository suite by SSMG4.
 
 Usage: python MDepository.py
+       python MDepository.py --all USER [git|zip|extract]
+                                          (default branch of every repo, no prompts)
+       python MDepository.py --manifest FILE [--dry-run]
+                                          (headless run, see depository_batch.py)
+       python MDepository.py --maintain   (repack/gc the git object stores)
 """
 
 import sys
-import time
 import os
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
+import depository_batch as batch
+import depository_http as http
+import depository_metrics as metrics
+import depository_pipeline as pipeline
+import depository_scheduler as scheduler
 from depository_core import (
     clear_screen, print_banner, print_token_status, section,
-    check_for_update, get_repos, get_branches,
-    do_download, prompt_download_method, print_repo_list,
-    select_branches, prompt_continue_menu,
-    UPDATE_CHECK_INTERVAL, OUTPUT_DIR, cleanup_pycache,
+    check_for_update, get_repos, prefetch_branches,
+    prompt_download_method, prompt_clone_profile, print_repo_list,
+    select_branches, prompt_continue_menu, branch_sha,
+    maintain_object_stores,
+    OUTPUT_DIR, cleanup_pycache,
 )
+from depository_lazy import lazy_import
 
-MAX_WORKERS = 4  # Concurrent downloads
+# asyncio and aiohttp load with the first large ZIP run, not at startup.
+aio = lazy_import("depository_async")
 
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -76,15 +87,24 @@ def ask_method_strategy() -> str:
 
 def build_download_jobs(username: str, selected_repos: list[dict],
                         method_strategy: str,
-                        global_use_git: bool | None) -> list[tuple] | None:
+                        global_method: str | None,
+                        prefetched: dict | None = None,
+                        global_profile=None) -> list[tuple] | None:
     """
     For each selected repo, show its info and let the user pick branches.
-    Returns a list of (username, repo_name, branch, use_git) tuples,
-    or None if the user types 'back' during any repo's branch selection
+    `prefetched` maps repo names to branch futures from prefetch_branches;
+    fetching starts here if it was not started earlier. `global_profile`
+    is the clone profile when one git method applies to all repos.
+    Returns a list of (username, repo_name, branch, method, sha, profile)
+    tuples, or None if the user types 'back' during any repo's branch selection
     (signals: go back to repo selection).
     """
     jobs = []
 
+    if prefetched is None:
+        prefetched = prefetch_branches(username,
+                                       [repo["name"] for repo in selected_repos])
+
     for i, repo in enumerate(selected_repos, 1):
         repo_name = repo["name"]
         desc      = (repo.get("description") or "").strip()
@@ -93,17 +113,15 @@ def build_download_jobs(username: str, selected_repos: list[dict],
         print_banner()
         section(f"Repo {i} of {len(selected_repos)}: {repo_name}")
 
-        print("  Fetching branches...")
-        branches = get_branches(username, repo_name)
+        future = prefetched[repo_name]
+        if not future.done():
+            print("  Fetching branches...")
+        branches = future.result()
         if branches is None or not branches:
             print(f"  Could not fetch branches for '{repo_name}'. Skipping.")
             input("  Press Enter to continue...")
             continue
 
-        clear_screen()
-        print_banner()
-        section(f"Repo {i} of {len(selected_repos)}: {repo_name}")
-
         selected_branches = select_branches(branches, repo_name,
                                             description=desc)
         if selected_branches is None:
@@ -117,12 +135,17 @@ def build_download_jobs(username: str, selected_repos: list[dict],
 
         if method_strategy == "per":
             print()
-            use_git = prompt_download_method()
+            method = prompt_download_method()
+            profile = None
+            if method == "git":
+                print()
+                profile = prompt_clone_profile()
         else:
-            use_git = global_use_git
+            method, profile = global_method, global_profile
 
         for branch in selected_branches:
-            jobs.append((username, repo_name, branch, use_git))
+            jobs.append((username, repo_name, branch, method,
+                         branch_sha(branches, branch), profile))
 
     return jobs
 
@@ -131,30 +154,105 @@ def build_download_jobs(username: str, selected_repos: list[dict],
 # Concurrent downloader
 # ──────────────────────────────────────────────────────────────────────────────
 
-def run_downloads(jobs: list[tuple]) -> dict[tuple, bool]:
-    results = {}
+def run_downloads(jobs: list[tuple], sizes: dict | None = None,
+                  notes: list[str] | None = None) -> dict[tuple, bool]:
+    """
+    Run the download jobs. `sizes` maps repo names to their API `size`
+    and is used to start the biggest downloads first; summary lines about
+    the run are appended to `notes`.
+    """
     os.makedirs(OUTPUT_DIR, exist_ok=True)
+    http.configure_pool(scheduler.max_workers())
 
     clear_screen()
     print_banner()
     section("Downloading")
-    print(f"  {len(jobs)} download(s) queued  —  up to {MAX_WORKERS} running at once\n")
 
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
-        future_to_job = {
-            pool.submit(do_download, user, repo, branch, use_git): (repo, branch)
-            for user, repo, branch, use_git in jobs
-        }
-        for future in as_completed(future_to_job):
-            repo_name, branch = future_to_job[future]
-            try:
-                ok = future.result()
-            except Exception as exc:
-                print(f"  [x]  {repo_name} [{branch}] — exception: {exc}")
-                ok = False
-            results[(repo_name, branch)] = ok
+    tasks = scheduler.group_jobs(jobs)
+    zip_tasks = sum(1 for task in tasks if task[3] == "zip")
+    if aio.available() and zip_tasks >= aio.ASYNC_MIN_JOBS:
+        git_workers = scheduler.git_workers()
+        print(f"  {len(jobs)} download(s) queued  —  up to "
+              f"{aio.ASYNC_CONCURRENCY} ZIP streams and {git_workers} other "
+              f"jobs running at once\n")
+        return aio.run_tasks(tasks, git_workers, sizes, notes)
+
+    print(f"  {len(jobs)} download(s) queued  —  git and ZIP downloads run in "
+          f"separate lanes, sized to the connection as they go\n")
+    return scheduler.run_tasks(tasks, sizes, notes)
+
+
+def _add_report(notes: list[str], path: str | None = None,
+                prometheus: str | None = None):
+    """Write the run's metrics report and mention it in the summary notes."""
+    report = metrics.write_report(notes, path, prometheus)
+    if report:
+        notes.append(f"Run report: {report}")
+
+
+def print_summary(results: dict[tuple, bool], notes: list[str]):
+    section("Download Summary")
+
+    ok_count   = sum(1 for v in results.values() if v)
+    fail_count = len(results) - ok_count
+
+    for (repo_name, branch), ok in sorted(results.items()):
+        mark = "[OK]  " if ok else "[FAIL]"
+        print(f"  {mark}  {repo_name} [{branch}]")
+
+    print(f"\n  {ok_count} succeeded, {fail_count} failed.")
+    for note in notes:
+        print(f"  {note}")
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Non-interactive mirror
+# ──────────────────────────────────────────────────────────────────────────────
+
+def run_mirror(username: str, method: str) -> bool:
+    """
+    Download the default branch of every repository of `username` without
+    any prompts, starting downloads while the listing is still loading.
+    Returns True if everything succeeded.
+    """
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    http.configure_pool(scheduler.max_workers() + pipeline.RESOLVE_WORKERS)
+    metrics.start_run()
+
+    print_banner()
+    print_token_status()
+    section(f"Mirroring {username} (default branches, {method})")
 
-    return results
+    notes = []
+    results = pipeline.mirror_default_branches(username, method, notes)
+    _add_report(notes)
+    print()
+    print_summary(results, notes)
+    return all(results.values())
+
+
+def run_batch(path: str, dry_run: bool = False) -> bool:
+    """
+    Execute (or with `dry_run`, only cost out) a manifest file.
+    Returns True if everything succeeded.
+    """
+    manifest = batch.load_manifest(path)
+    if manifest is None:
+        return False
+
+    print_banner()
+    print_token_status()
+    if dry_run:
+        section("Dry run")
+        return batch.dry_run(manifest)
+
+    metrics.start_run()
+    notes = []
+    results = batch.run_manifest(manifest, notes)
+    _add_report(notes, manifest.get("report"), manifest.get("prometheus"))
+    print()
+    print_summary(results, notes)
+    return bool(results) and all(results.values())
 
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -163,13 +261,9 @@ def run_downloads(jobs: list[tuple]) -> dict[tuple, bool]:
 
 def run():
     current_username = None
-    check_for_update()
-    last_check = time.time()
 
     while True:
-        if time.time() - last_check > UPDATE_CHECK_INTERVAL:
-            check_for_update()
-            last_check = time.time()
+        check_for_update()
 
         # ── Username prompt ───────────────────────────────────
         clear_screen()
@@ -186,6 +280,7 @@ def run():
                 continue
 
         # ── Fetch repos ───────────────────────────────────────
+        metrics.start_run()
         print(f"\n  Fetching repositories for '{username}'...")
         repos = get_repos(username)
         if repos is None:
@@ -216,16 +311,26 @@ def run():
 
             selected_repos_list = [repos[i] for i in repo_indexes]
 
+            # Branch lists load in the background while the user answers
+            # the method prompts and configures the first repositories.
+            prefetched = prefetch_branches(
+                username, [repo["name"] for repo in selected_repos_list])
+
             # ── Method strategy ───────────────────────────────
             method_strategy = ask_method_strategy()
-            global_use_git: bool | None = None
+            global_method: str | None = None
+            global_profile = None
             if method_strategy == "same":
                 print()
-                global_use_git = prompt_download_method()
+                global_method = prompt_download_method()
+                if global_method == "git":
+                    print()
+                    global_profile = prompt_clone_profile()
 
             # ── Per-repo branch config ────────────────────────
             jobs = build_download_jobs(username, selected_repos_list,
-                                       method_strategy, global_use_git)
+                                       method_strategy, global_method,
+                                       prefetched, global_profile)
 
             if jobs is None:
                 # User typed 'back' during branch selection — re-show repo list
@@ -237,21 +342,16 @@ def run():
                 continue
 
             # ── Run downloads ─────────────────────────────────
-            results = run_downloads(jobs)
+            sizes = {repo["name"]: repo.get("size", 0)
+                     for repo in selected_repos_list}
+            notes = []
+            results = run_downloads(jobs, sizes, notes)
+            _add_report(notes)
 
             # ── Summary ───────────────────────────────────────
             clear_screen()
             print_banner()
-            section("Download Summary")
-
-            ok_count   = sum(1 for v in results.values() if v)
-            fail_count = len(results) - ok_count
-
-            for (repo_name, branch), ok in sorted(results.items()):
-                mark = "[OK]  " if ok else "[FAIL]"
-                print(f"  {mark}  {repo_name} [{branch}]")
-
-            print(f"\n  {ok_count} succeeded, {fail_count} failed.")
+            print_summary(results, notes)
 
             # ── Continue? ─────────────────────────────────────
             choice = prompt_continue_menu()
@@ -271,4 +371,23 @@ def run():
 
 
 if __name__ == "__main__":
-    run()
+    args = sys.argv[1:]
+    if "--maintain" in args:
+        section("Object store maintenance")
+        maintain_object_stores()
+    elif args[:1] == ["--all"]:
+        if len(args) < 2 or args[2:3] not in ([], ["git"], ["zip"], ["extract"]):
+            print(__doc__)
+            sys.exit(2)
+        ok = run_mirror(args[1], args[2] if len(args) > 2 else "zip")
+        cleanup_pycache()
+        sys.exit(0 if ok else 1)
+    elif args[:1] == ["--manifest"]:
+        if len(args) < 2 or args[2:] not in ([], ["--dry-run"]):
+            print(__doc__)
+            sys.exit(2)
+        ok = run_batch(args[1], dry_run="--dry-run" in args)
+        cleanup_pycache()
+        sys.exit(0 if ok else 1)
+    else:
+        run()
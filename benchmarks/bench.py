@@ -0,0 +1,241 @@
+"""
+bench.py  —  Offline performance benchmarks for Depository.
+
+Starts a local fake GitHub (see fake_github.py) and measures:
+  listing   repository listing latency, cold and with a warm ETag cache
+  branches  branch lookups for many repositories
+  zip       ZIP throughput per ZIP-lane worker count, and with adaptive sizing
+  extract   streamed tarball extraction throughput
+  clone     shallow clone throughput per git-lane worker count (git http-backend),
+            with tuned git settings and once with git's defaults
+
+Usage: python benchmarks/bench.py [--quick] [--only zip,clone] [--json FILE]
+                                  [--latency S] [--bandwidth BYTES_PER_S]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from fake_github import FakeGitHub, make_git_repos
+
+# ──────────────────────────────────────────────
+# Constants
+# ──────────────────────────────────────────────
+
+OWNER = "bench"
+SCENARIOS = ("listing", "branches", "zip", "extract", "clone")
+
+PROFILES = {
+    "full": {"repos": 500, "jobs": 64, "size": 2 << 20,
+             "workers": (1, 2, 4, 8, 16, 32),
+             "clones": 16, "clone_size": 2 << 20, "clone_workers": (1, 2, 4, 8)},
+    "quick": {"repos": 150, "jobs": 16, "size": 256 << 10,
+              "workers": (1, 4, 16),
+              "clones": 4, "clone_size": 256 << 10, "clone_workers": (1, 2)},
+}
+
+
+# ──────────────────────────────────────────────
+# Helpers
+# ──────────────────────────────────────────────
+
+def _timed(fn, *args) -> tuple[float, object]:
+    started = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - started, result
+
+
+@contextlib.contextmanager
+def _quiet():
+    """Swallow the tool's own progress output while a scenario runs."""
+    with contextlib.redirect_stdout(io.StringIO()), \
+            contextlib.redirect_stderr(io.StringIO()):
+        yield
+
+
+def _fresh(folder: str) -> str:
+    shutil.rmtree(folder, ignore_errors=True)
+    os.makedirs(folder)
+    return folder
+
+
+def _mbps(n: float, seconds: float) -> float:
+    return round(n / seconds / (1 << 20), 2) if seconds else 0.0
+
+
+# ──────────────────────────────────────────────
+# Scenarios
+# ──────────────────────────────────────────────
+
+def bench_listing(env: dict, profile: dict) -> list[dict]:
+    core, cache = env["core"], env["cache"]
+    shutil.rmtree(cache.HTTP_CACHE_DIR, ignore_errors=True)
+    rows = []
+    for label in ("cold", "warm (304)"):
+        seconds, repos = _timed(core.get_repos, OWNER)
+        rows.append({"scenario": "listing", "case": label,
+                     "repos": len(repos or []), "seconds": round(seconds, 3)})
+    return rows
+
+
+def bench_branches(env: dict, profile: dict) -> list[dict]:
+    core, cache = env["core"], env["cache"]
+    shutil.rmtree(cache.HTTP_CACHE_DIR, ignore_errors=True)
+    names = [f"repo{i:04d}" for i in range(min(50, profile["repos"]))]
+    futures = core.prefetch_branches(OWNER, names)
+    started = time.perf_counter()
+    found = sum(1 for f in futures.values() if f.result())
+    seconds = time.perf_counter() - started
+    return [{"scenario": "branches", "case": f"{len(names)} repos (prefetch)",
+             "repos": found, "seconds": round(seconds, 3)}]
+
+
+def _run_lane(env: dict, method: str, tasks: list[tuple], lane: str,
+              workers: int | None, out: str) -> tuple[float, int, int]:
+    """Run `tasks` with the lane pinned to `workers` (None = adaptive)."""
+    core, scheduler, archive = env["core"], env["scheduler"], env["archive"]
+    core.OUTPUT_DIR = _fresh(out)
+    scheduler.pin_workers(lane, workers)
+    before = archive.bytes_downloaded()
+    with _quiet():
+        seconds, results = _timed(scheduler.run_tasks, tasks)
+    scheduler.pin_workers(lane, None)
+    return seconds, sum(results.values()), archive.bytes_downloaded() - before
+
+
+def bench_archives(env: dict, profile: dict, method: str) -> list[dict]:
+    tasks = [(OWNER, f"repo{i:04d}", [("main", None)], method, None)
+             for i in range(profile["jobs"])]
+    rows = []
+    for workers in (*profile["workers"], None):
+        seconds, ok, transferred = _run_lane(env, method, tasks, "zip", workers,
+                                             os.path.join(env["tmp"], "out"))
+        rows.append({"scenario": method,
+                     "case": f"{workers} workers" if workers else "adaptive",
+                     "jobs": f"{ok}/{len(tasks)}", "seconds": round(seconds, 3),
+                     "MB/s": _mbps(transferred, seconds)})
+    return rows
+
+
+def bench_clone(env: dict, profile: dict) -> list[dict]:
+    if shutil.which("git") is None:
+        return [{"scenario": "clone", "case": "skipped (git not installed)"}]
+    names = [f"repo{i:04d}" for i in range(profile["clones"])]
+    make_git_repos(env["git_root"], OWNER, names, profile["clone_size"])
+    tasks = [(OWNER, name, [("main", None)], "git", None) for name in names]
+    total = profile["clones"] * profile["clone_size"]
+    rows = []
+    gitops = env["gitops"]
+    cases = [(workers, True) for workers in profile["clone_workers"]]
+    cases.append((profile["clone_workers"][-1], False))   # git's own defaults
+    for workers, tuning in cases:
+        gitops.GIT_TUNING = tuning
+        seconds, ok, _ = _run_lane(env, "git", tasks, "git", workers,
+                                   os.path.join(env["tmp"], "clones"))
+        rows.append({"scenario": "clone",
+                     "case": f"{workers} workers" + ("" if tuning else ", untuned"),
+                     "jobs": f"{ok}/{len(tasks)}", "seconds": round(seconds, 3),
+                     "MB/s": _mbps(total, seconds)})
+    gitops.GIT_TUNING = True
+    return rows
+
+
+# ──────────────────────────────────────────────
+# Main
+# ──────────────────────────────────────────────
+
+def _print_table(rows: list[dict]):
+    columns = []
+    for row in rows:
+        columns += [key for key in row if key not in columns]
+    widths = {c: max(len(c), *(len(str(r.get(c, ""))) for r in rows)) for c in columns}
+    lines = [columns, ["-" * widths[c] for c in columns]]
+    lines += [[str(row.get(c, "")) for c in columns] for row in rows]
+    for cells in lines:
+        print("  " + "  ".join(cell.ljust(widths[c])
+                               for c, cell in zip(columns, cells)).rstrip())
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--quick", action="store_true", help="small sizes, for CI")
+    parser.add_argument("--only", default=",".join(SCENARIOS),
+                        help="comma-separated scenarios to run")
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="API latency in seconds (default 0.05)")
+    parser.add_argument("--bandwidth", type=int, default=4 << 20,
+                        help="per-connection archive bandwidth, bytes/s (0 = unlimited)")
+    parser.add_argument("--json", metavar="FILE", help="also write the results as JSON")
+    args = parser.parse_args()
+    profile = PROFILES["quick" if args.quick else "full"]
+    only = [s.strip() for s in args.only.split(",") if s.strip()]
+
+    tmp = tempfile.mkdtemp(prefix="depository-bench-")
+    git_root = os.path.join(tmp, "git")
+    fake = FakeGitHub(repos=profile["repos"], latency=args.latency,
+                      archive_size=profile["size"], bandwidth=args.bandwidth,
+                      git_root=git_root).start()
+
+    # Configuration is read at import time, so point it at the fake first.
+    os.environ.update({
+        "DEPOSITORY_API_URL": fake.api_url,
+        "DEPOSITORY_WEB_URL": fake.web_url,
+        "DEPOSITORY_CACHE_DIR": os.path.join(tmp, "cache"),
+        "DEPOSITORY_ARCHIVE_CACHE": "0",
+        "DEPOSITORY_REPORT_DIR": os.path.join(tmp, "reports"),
+        "GITHUB_TOKEN_DEPOSITORY": "",
+    })
+    import depository_archive as archive
+    import depository_cache as cache
+    import depository_core as core
+    import depository_git as gitops
+    import depository_http as http
+    import depository_scheduler as scheduler
+
+    http.configure_pool(64)
+    env = {"archive": archive, "cache": cache, "core": core, "gitops": gitops,
+           "scheduler": scheduler, "tmp": tmp, "git_root": git_root}
+
+    print(f"  Fake GitHub: API {fake.api_url}, web {fake.web_url}, "
+          f"latency {args.latency * 1000:.0f} ms, "
+          f"bandwidth {args.bandwidth / (1 << 20):.1f} MB/s per connection\n")
+    rows = []
+    try:
+        for scenario in only:
+            if scenario == "listing":
+                rows += bench_listing(env, profile)
+            elif scenario == "branches":
+                rows += bench_branches(env, profile)
+            elif scenario in ("zip", "extract"):
+                rows += bench_archives(env, profile, scenario)
+            elif scenario == "clone":
+                rows += bench_clone(env, profile)
+            else:
+                print(f"  [x]  Unknown scenario '{scenario}'.")
+                return 2
+    finally:
+        fake.stop()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    _print_table(rows)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"profile": "quick" if args.quick else "full",
+                       "latency": args.latency, "bandwidth": args.bandwidth,
+                       "api_requests": fake.api_requests, "results": rows}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
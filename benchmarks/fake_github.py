@@ -0,0 +1,336 @@
+"""
+fake_github.py
+A local stand-in for GitHub used by the benchmarks: the REST API on one
+port, archives and git smart HTTP on another, so nothing touches the
+network.
+
+API:  /users/<owner>/repos, /repos/<owner>/<repo>, /repos/<owner>/<repo>/branches
+      and /branches/<name>, paginated with Link headers, ETags / 304s,
+      X-RateLimit-* headers and a configurable per-request latency.
+Web:  /<owner>/<repo>/archive/<ref>.zip and .tar.gz (Range requests,
+      optional per-connection bandwidth cap), and /<owner>/<repo>.git/...
+      served by `git http-backend` from a folder of bare repositories.
+"""
+
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import tarfile
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# ──────────────────────────────────────────────
+# Constants
+# ──────────────────────────────────────────────
+
+CHUNK_SIZE = 65536
+DEFAULT_QUOTA = 5000
+
+
+# ──────────────────────────────────────────────
+# Fixtures
+# ──────────────────────────────────────────────
+
+def _payload(size: int, seed: int = 0) -> bytes:
+    """Incompressible bytes, so archive sizes are what they say."""
+    return random.Random(seed).randbytes(size)
+
+
+def make_zip(size: int) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_STORED) as z:
+        z.writestr("repo-main/README.md", "benchmark fixture\n")
+        z.writestr("repo-main/data.bin", _payload(size))
+    return buf.getvalue()
+
+
+def make_tarball(size: int) -> bytes:
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz", compresslevel=1) as tar:
+        for name, data in (("repo-main/README.md", b"benchmark fixture\n"),
+                           ("repo-main/data.bin", _payload(size, 1))):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+
+def make_git_repos(root: str, owner: str, names: list[str], size: int) -> str:
+    """
+    Create bare repositories root/<owner>/<name>.git, each with one commit
+    on "main" holding `size` bytes of incompressible data.
+    Returns `root`.
+    """
+    work = os.path.join(root, ".work")
+    for i, name in enumerate(names):
+        shutil.rmtree(work, ignore_errors=True)
+        os.makedirs(work)
+        with open(os.path.join(work, "data.bin"), "wb") as f:
+            f.write(_payload(size, i))
+        git = ["git", "-C", work, "-c", "user.name=bench",
+               "-c", "user.email=bench@example.invalid"]
+        subprocess.run(["git", "init", "-q", "-b", "main", work], check=True)
+        subprocess.run(git + ["add", "."], check=True)
+        subprocess.run(git + ["commit", "-q", "-m", "fixture"], check=True)
+        bare = os.path.join(root, owner, f"{name}.git")
+        shutil.rmtree(bare, ignore_errors=True)
+        subprocess.run(["git", "clone", "-q", "--bare", work, bare], check=True)
+        # Let clients ask for partial (blobless / treeless) clones.
+        subprocess.run(["git", "-C", bare, "config", "uploadpack.allowFilter", "true"],
+                       check=True)
+    shutil.rmtree(work, ignore_errors=True)
+    return root
+
+
+# ──────────────────────────────────────────────
+# Server
+# ──────────────────────────────────────────────
+
+class FakeGitHub:
+    """
+    Start with start(), stop with stop(). `api_url` / `web_url` are the
+    base URLs to export as DEPOSITORY_API_URL / DEPOSITORY_WEB_URL.
+    """
+
+    def __init__(self, repos: int = 300, branches: int = 3,
+                 latency: float = 0.05, archive_size: int = 1024 * 1024,
+                 bandwidth: int = 0, git_root: str | None = None,
+                 quota: int = DEFAULT_QUOTA):
+        self.repos = repos
+        self.branches = branches
+        self.latency = latency
+        self.bandwidth = bandwidth          # bytes/s per archive connection, 0 = unlimited
+        self.weak_etags = False             # archive ETags sent as W/"..."
+        self.ranges = True                  # honour Range (Accept-Ranges is sent anyway)
+        self.archive_failures = 0           # archive requests still to answer with 503
+        self.git_root = git_root
+        self.quota = quota
+        self.remaining = quota
+        self.reset_at = int(time.time()) + 3600
+        self.zip_blob = make_zip(archive_size)
+        self.tar_blob = make_tarball(archive_size)
+        self.api_requests = 0
+        self.lock = threading.Lock()
+        self._servers = []
+
+    # ── API payloads ───────────────────────────────────────
+    def repo_list(self, owner: str) -> list[dict]:
+        return [{"name": f"repo{i:04d}", "full_name": f"{owner}/repo{i:04d}",
+                 "description": "benchmark fixture", "fork": False,
+                 "size": len(self.zip_blob) // 1024, "default_branch": "main"}
+                for i in range(self.repos)]
+
+    def branch_list(self, repo: str) -> list[dict]:
+        names = ["main"] + [f"release-{i}" for i in range(1, self.branches)]
+        return [{"name": name, "commit": {"sha": hashlib.sha1(
+                    f"{repo}/{name}".encode()).hexdigest()}}
+                for name in names]
+
+    # ── lifecycle ──────────────────────────────────────────
+    def start(self) -> "FakeGitHub":
+        for handler in (_ApiHandler, _WebHandler):
+            server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+            server.daemon_threads = True
+            server.fake = self
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self._servers.append(server)
+        return self
+
+    def stop(self):
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+
+    @property
+    def api_url(self) -> str:
+        return f"http://127.0.0.1:{self._servers[0].server_address[1]}"
+
+    @property
+    def web_url(self) -> str:
+        return f"http://127.0.0.1:{self._servers[1].server_address[1]}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    @property
+    def fake(self) -> FakeGitHub:
+        return self.server.fake
+
+    def send(self, status: int, body: bytes = b"", headers: dict | None = None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+
+class _ApiHandler(_Handler):
+    def do_GET(self):
+        fake = self.fake
+        time.sleep(fake.latency)
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        page = int(query.get("page", ["1"])[0])
+        per_page = int(query.get("per_page", ["30"])[0])
+
+        if match := re.fullmatch(r"/users/([^/]+)/repos", url.path):
+            items = fake.repo_list(match.group(1))
+        elif match := re.fullmatch(r"/repos/([^/]+)/([^/]+)/branches", url.path):
+            items = fake.branch_list(match.group(2))
+        elif match := re.fullmatch(r"/repos/([^/]+)/([^/]+)/branches/([^/]+)", url.path):
+            found = [b for b in fake.branch_list(match.group(2))
+                     if b["name"] == match.group(3)]
+            return self.reply(found[0] if found else None)
+        elif match := re.fullmatch(r"/repos/([^/]+)/([^/]+)", url.path):
+            return self.reply({"name": match.group(2),
+                               "full_name": f"{match.group(1)}/{match.group(2)}"})
+        else:
+            return self.reply(None)
+
+        last = max(1, -(-len(items) // per_page))
+        links = []
+        if page < last:
+            base = f"{fake.api_url}{url.path}?per_page={per_page}"
+            links = [f'<{base}&page={page + 1}>; rel="next"',
+                     f'<{base}&page={last}>; rel="last"']
+        self.reply(items[(page - 1) * per_page:page * per_page], links)
+
+    def reply(self, data, links: list[str] | None = None):
+        fake = self.fake
+        body = json.dumps(data).encode()
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        not_modified = self.headers.get("If-None-Match") == etag
+        with fake.lock:
+            fake.api_requests += 1
+            if not not_modified and fake.remaining > 0:
+                fake.remaining -= 1
+            remaining = fake.remaining
+        headers = {"Content-Type": "application/json", "ETag": etag,
+                   "X-RateLimit-Limit": str(fake.quota),
+                   "X-RateLimit-Remaining": str(remaining),
+                   "X-RateLimit-Reset": str(fake.reset_at)}
+        if links:
+            headers["Link"] = ", ".join(links)
+        if remaining <= 0 and not not_modified:
+            return self.send(403, b'{"message": "API rate limit exceeded"}', headers)
+        if not_modified:
+            return self.send(304, b"", headers)
+        if data is None:
+            return self.send(404, b'{"message": "Not Found"}', headers)
+        self.send(200, body, headers)
+
+
+class _WebHandler(_Handler):
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path.endswith(".zip"):
+            return self.archive(self.fake.zip_blob, "application/zip")
+        if path.endswith(".tar.gz"):
+            return self.archive(self.fake.tar_blob, "application/gzip")
+        if ".git/" in path:
+            return self.git()
+        self.send(404)
+
+    def do_POST(self):
+        if ".git/" in self.path:
+            return self.git()
+        self.send(404)
+
+    def archive(self, blob: bytes, content_type: str):
+        with self.fake.lock:
+            fail = self.fake.archive_failures > 0
+            self.fake.archive_failures -= fail
+        if fail:
+            return self.send(503, b"unavailable")
+        etag = f'"{hashlib.md5(blob[:4096]).hexdigest()}"'
+        if self.fake.weak_etags:
+            etag = f"W/{etag}"
+        start, end, status = 0, len(blob) - 1, 200
+        byte_range = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        # If-Range only matches strong ETags (RFC 9110 13.1.5).
+        if_range = self.headers.get("If-Range")
+        if (byte_range and self.fake.ranges
+                and (if_range is None or (if_range == etag and not etag.startswith("W/")))):
+            start = int(byte_range.group(1))
+            end = int(byte_range.group(2) or end)
+            status = 206
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("ETag", etag)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(blob)}")
+        self.end_headers()
+
+        bandwidth = self.fake.bandwidth
+        began = time.monotonic()
+        sent = 0
+        for offset in range(start, end + 1, CHUNK_SIZE):
+            chunk = blob[offset:min(offset + CHUNK_SIZE, end + 1)]
+            self.wfile.write(chunk)
+            sent += len(chunk)
+            if bandwidth:
+                ahead = sent / bandwidth - (time.monotonic() - began)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+    def _read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            body = b""
+            while True:
+                size = int(self.rfile.readline().split(b";")[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return body
+                body += self.rfile.read(size)
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def git(self):
+        """Proxy a smart-HTTP request to `git http-backend` (CGI)."""
+        if not self.fake.git_root:
+            return self.send(404)
+        url = urlparse(self.path)
+        env = {
+            **os.environ,
+            "GIT_PROJECT_ROOT": os.path.abspath(self.fake.git_root),
+            "GIT_HTTP_EXPORT_ALL": "1",
+            "PATH_INFO": url.path,
+            "QUERY_STRING": url.query,
+            "REQUEST_METHOD": self.command,
+            "CONTENT_TYPE": self.headers.get("Content-Type", ""),
+            "REMOTE_ADDR": "127.0.0.1",
+        }
+        if self.headers.get("Content-Encoding"):
+            env["HTTP_CONTENT_ENCODING"] = self.headers["Content-Encoding"]
+        if self.headers.get("Git-Protocol"):
+            env["GIT_PROTOCOL"] = self.headers["Git-Protocol"]
+        body = self._read_body() if self.command == "POST" else b""
+        env["CONTENT_LENGTH"] = str(len(body))
+
+        out = subprocess.run(["git", "http-backend"], input=body, env=env,
+                             capture_output=True, check=False).stdout
+        head, _, payload = out.partition(b"\r\n\r\n")
+        status, headers = 200, {}
+        for line in head.decode("latin-1").split("\r\n"):
+            key, _, value = line.partition(":")
+            if key.lower() == "status":
+                status = int(value.split()[0])
+            elif key:
+                headers[key.strip()] = value.strip()
+        self.send(status, payload, headers)
@@ -0,0 +1,418 @@
+"""
+depository_archive.py
+Resumable, optionally segmented archive downloads, and streaming
+extraction of tarballs straight into a folder.
+
+Data is written to '<name>.part' and only renamed to '<name>' once
+complete, so an interrupted download can be resumed with an HTTP Range
+request on the next attempt or the next run. '<name>.part.json' records
+the archive's ETag (resumes use If-Range, so a changed archive restarts
+from zero) and, for segmented downloads, how far each segment got.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+import json
+import shutil
+import tarfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import depository_http as http
+import depository_metrics as metrics
+from depository_lazy import lazy_import
+
+requests = lazy_import("requests")
+tqdm = lazy_import("tqdm")
+
+# ──────────────────────────────────────────────
+# Constants
+# ──────────────────────────────────────────────
+
+CHUNK_SIZE = 65536
+ARCHIVE_RETRIES = 3                     # resume attempts after a network error
+RETRY_DELAY = 1.0                       # first wait (s) before a retry, doubled each time
+SEGMENT_THRESHOLD = 64 * 1024 * 1024    # archives at least this big are split
+SEGMENTS = 4                            # parallel connections per large archive
+STATE_FLUSH_BYTES = 4 * 1024 * 1024     # progress written to disk this often
+
+_bytes_downloaded = 0
+_bytes_lock = threading.Lock()
+
+# Per-archive tqdm bars; turned off while a live display shows the totals.
+progress_bars = True
+
+
+class ArchiveHTTPError(Exception):
+    """The server refused the archive with a non-retryable status."""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+# ──────────────────────────────────────────────
+# Transfer counter
+# ──────────────────────────────────────────────
+
+def count_bytes(n: int):
+    """
+    Add to the process-wide archive byte counter (read by the scheduler)
+    and to the metrics of the job running in this thread.
+    """
+    global _bytes_downloaded
+    with _bytes_lock:
+        _bytes_downloaded += n
+    metrics.add_bytes(n)
+
+
+def bytes_downloaded() -> int:
+    return _bytes_downloaded
+
+
+# ──────────────────────────────────────────────
+# Internal helpers
+# ──────────────────────────────────────────────
+
+def _load_state(state_path: str, url: str) -> dict | None:
+    try:
+        with open(state_path, encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return state if state.get("url") == url else None
+
+
+def _save_state(state_path: str, state: dict):
+    tmp = f"{state_path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, state_path)
+
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _strong_etag(etag: str | None) -> str | None:
+    """`etag` if it is strong; If-Range ignores weak ones (W/"...")."""
+    return etag if etag and not etag.startswith("W/") else None
+
+
+class _RangeIgnored(Exception):
+    """A segment request was answered with the whole archive (200)."""
+
+
+def _check_status(resp: requests.Response, *expected: int):
+    if resp.status_code in expected:
+        return
+    if resp.status_code >= 500:
+        raise requests.HTTPError(f"HTTP {resp.status_code}", response=resp)
+    raise ArchiveHTTPError(resp.status_code)
+
+
+def _fetch_stream(url: str, part: str, state_path: str, state: dict | None,
+                  desc: str, segmented: bool = True) -> dict:
+    """
+    Download (or resume) `url` into `part` over a single connection.
+    If `segmented`, the server supports ranges and the archive is large,
+    nothing is streamed; instead the returned state carries a segment plan.
+    """
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+    headers = http.auth_headers()
+    if offset and state and state.get("etag"):
+        headers["Range"] = f"bytes={offset}-"
+        headers["If-Range"] = state["etag"]
+    else:
+        offset = 0
+
+    with http.get(url, stream=True, headers=headers) as r:
+        if r.status_code == 416:
+            _remove_quietly(part)
+            raise requests.HTTPError("stale partial download", response=r)
+        _check_status(r, 200, 206)
+        if r.status_code == 200:
+            offset = 0
+
+        length = int(r.headers.get("content-length", 0))
+        total = offset + length if length else 0
+        state = {"url": url, "etag": _strong_etag(r.headers.get("ETag"))}
+
+        if segmented and wants_segments(r.status_code, r.headers, total):
+            step = -(-total // SEGMENTS)
+            state["size"] = total
+            state["segments"] = [[start, min(start + step, total) - 1, 0]
+                                 for start in range(0, total, step)]
+            with open(part, "wb") as f:
+                f.truncate(total)
+            _save_state(state_path, state)
+            return state
+
+        _save_state(state_path, state)
+        with open(part, "ab" if offset else "wb") as f, tqdm.tqdm(
+            total=total or None, initial=offset, unit="B", unit_scale=True,
+            desc=desc, leave=True, disable=not progress_bars
+        ) as bar:
+            for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                if chunk:
+                    f.write(chunk)
+                    bar.update(len(chunk))
+                    count_bytes(len(chunk))
+    return state
+
+
+def _fetch_segments(url: str, part: str, state_path: str, state: dict,
+                    desc: str):
+    """
+    Fill the unfinished byte ranges of a preallocated `part` in parallel.
+    A segment's progress in the state only counts bytes it has flushed
+    and fsynced, so a resume after a crash never trusts unwritten ranges.
+    Raises _RangeIgnored if the server sends the whole archive instead.
+    """
+    lock = threading.Lock()
+    done_bytes = sum(seg[2] for seg in state["segments"])
+    job = metrics.current_job()
+
+    def fetch(seg: list):
+        with metrics.bind(job):
+            fetch_range(seg)
+
+    def checkpoint(f, seg: list, written: int):
+        f.flush()
+        os.fsync(f.fileno())
+        with lock:
+            seg[2] = written
+            _save_state(state_path, state)
+
+    def fetch_range(seg: list):
+        start, end, done = seg
+        if start + done > end:
+            return
+        headers = http.auth_headers()
+        headers["Range"] = f"bytes={start + done}-{end}"
+        headers["If-Range"] = state["etag"]
+        with http.get(url, stream=True, headers=headers) as r, \
+                open(part, "r+b") as f:
+            if r.status_code == 200:
+                # Ranges ignored, or the archive changed since the plan.
+                raise _RangeIgnored("server sent the whole archive")
+            _check_status(r, 206)
+            f.seek(start + done)
+            written, unsaved = done, 0
+            for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                if not chunk:
+                    continue
+                f.write(chunk)
+                count_bytes(len(chunk))
+                written += len(chunk)
+                unsaved += len(chunk)
+                with lock:
+                    bar.update(len(chunk))
+                if unsaved >= STATE_FLUSH_BYTES:
+                    checkpoint(f, seg, written)
+                    unsaved = 0
+            checkpoint(f, seg, written)
+
+    with tqdm.tqdm(total=state["size"], initial=done_bytes, unit="B",
+                   unit_scale=True, desc=desc, leave=True,
+                   disable=not progress_bars) as bar, \
+            ThreadPoolExecutor(max_workers=SEGMENTS) as pool:
+        futures = [pool.submit(fetch, seg) for seg in state["segments"]]
+        for future in futures:
+            future.result()
+
+
+def _member_path(name: str) -> str | None:
+    """
+    Path of a tarball member relative to the archive's top-level folder,
+    or None for the folder itself and for anything escaping it.
+    """
+    parts = name.replace("\\", "/").split("/")[1:]
+    parts = [p for p in parts if p not in ("", ".")]
+    if not parts or ".." in parts or os.path.isabs(parts[0]):
+        return None
+    return os.path.join(*parts)
+
+
+def _inside(root: str, path: str) -> bool:
+    """True if `path`, with every symlink resolved, is within `root` (a realpath)."""
+    resolved = os.path.realpath(path)
+    return resolved == root or resolved.startswith(root + os.sep)
+
+
+def _drop_escaping_links(root: str):
+    """
+    Remove symlinks under `root` that resolve outside it. Each link is
+    checked when created, but a later link can reroute an earlier one.
+    """
+    for folder, dirs, files in os.walk(root):
+        for name in dirs + files:
+            path = os.path.join(folder, name)
+            if os.path.islink(path) and not _inside(root, path):
+                os.unlink(path)
+
+
+class _ProgressReader:
+    """File-like wrapper that reports bytes read to a tqdm bar."""
+
+    def __init__(self, raw, bar: tqdm.tqdm):
+        self.raw = raw
+        self.bar = bar
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.raw.read(size)
+        self.bar.update(len(data))
+        count_bytes(len(data))
+        return data
+
+
+# ──────────────────────────────────────────────
+# Public API
+# ──────────────────────────────────────────────
+
+def retry_delay(attempt: int) -> float:
+    """Seconds to wait before retry number `attempt` (0-based) of a download."""
+    return RETRY_DELAY * 2 ** attempt
+
+
+def wants_segments(status_code: int, headers, total: int) -> bool:
+    """
+    True if a full (200) response is worth re-fetching in parallel
+    segments. Needs a strong ETag, since If-Range ignores weak ones.
+    """
+    return (status_code == 200 and bool(_strong_etag(headers.get("ETag")))
+            and headers.get("Accept-Ranges") == "bytes"
+            and total >= SEGMENT_THRESHOLD)
+
+
+def resume_point(url: str, local_path: str) -> tuple[int, dict] | None:
+    """
+    For callers streaming an archive themselves: the byte offset to resume
+    `local_path` from and the Range/If-Range headers to send. Returns None
+    while a segmented download is in progress (only fetch_archive can
+    continue that one).
+    """
+    part = f"{local_path}.part"
+    state = _load_state(f"{part}.json", url)
+    if not os.path.exists(part) or not state:
+        return 0, {}
+    if state.get("segments"):
+        return None
+    if not _strong_etag(state.get("etag")):
+        return 0, {}
+    offset = os.path.getsize(part)
+    return offset, {"Range": f"bytes={offset}-", "If-Range": state["etag"]}
+
+
+def record_part(url: str, local_path: str, etag: str | None):
+    """Remember the ETag of the archive being written to '<local_path>.part'."""
+    _save_state(f"{local_path}.part.json", {"url": url, "etag": _strong_etag(etag)})
+
+
+def finish_part(local_path: str):
+    """Move a completed '<local_path>.part' into place."""
+    os.replace(f"{local_path}.part", local_path)
+    _remove_quietly(f"{local_path}.part.json")
+
+
+def fetch_archive(url: str, local_path: str, desc: str = ""):
+    """
+    Download `url` to `local_path`, resuming any earlier partial download.
+    Network errors are retried from where they stopped; the partial file
+    is kept on final failure so the next run can resume it.
+    Raises ArchiveHTTPError for refused requests (e.g. 404), or the last
+    network error once retries are exhausted.
+    """
+    part = f"{local_path}.part"
+    state_path = f"{part}.json"
+
+    segmented = True
+    attempt = 0
+    while True:
+        try:
+            state = _load_state(state_path, url)
+            if not (state and state.get("segments") and os.path.exists(part)):
+                state = _fetch_stream(url, part, state_path, state, desc, segmented)
+            if state.get("segments"):
+                _fetch_segments(url, part, state_path, state, desc)
+            break
+        except _RangeIgnored:
+            # Ranges are not honoured after all: fall back to one stream
+            # (not counted as a retry).
+            _remove_quietly(state_path)
+            segmented = False
+        except requests.RequestException as exc:
+            response = getattr(exc, "response", None)
+            if response is not None and response.status_code == 200:
+                _remove_quietly(state_path)
+            if attempt == ARCHIVE_RETRIES:
+                raise
+            time.sleep(retry_delay(attempt))
+            attempt += 1
+            metrics.note_retry()
+
+    finish_part(local_path)
+
+
+def extract_archive(url: str, dest_folder: str, desc: str = ""):
+    """
+    Stream a .tar.gz from `url` and unpack it into `dest_folder` on the
+    fly: no archive file is written and memory use stays at one chunk.
+    The archive's top-level folder is stripped; anything that would land
+    outside the destination, also through symlinks, and special files
+    are skipped. The tree is built in
+    '<dest_folder>.extracting' and swapped in only once complete.
+    Raises ArchiveHTTPError for refused requests.
+    """
+    work = f"{dest_folder}.extracting"
+    if os.path.exists(work):
+        shutil.rmtree(work)
+    os.makedirs(work)
+    root = os.path.realpath(work)
+
+    with http.get(url, stream=True, headers=http.auth_headers()) as r:
+        _check_status(r, 200)
+        r.raw.decode_content = True
+        total = int(r.headers.get("content-length", 0)) or None
+        with tqdm.tqdm(total=total, unit="B", unit_scale=True, desc=desc,
+                       leave=True, disable=not progress_bars) as bar, \
+                tarfile.open(fileobj=_ProgressReader(r.raw, bar),
+                             mode="r|gz") as tar:
+            for member in tar:
+                rel = _member_path(member.name)
+                if rel is None:
+                    continue
+                target = os.path.join(work, rel)
+                # Resolved through the links extracted so far, before
+                # anything is created.
+                if not _inside(root, target):
+                    continue
+                if os.path.islink(target):
+                    os.unlink(target)
+                if member.isdir():
+                    os.makedirs(target, exist_ok=True)
+                elif member.isfile():
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    with tar.extractfile(member) as src, open(target, "wb") as dst:
+                        shutil.copyfileobj(src, dst, CHUNK_SIZE)
+                    if member.mode & 0o111:
+                        os.chmod(target, 0o755)
+                elif member.issym():
+                    link_target = os.path.join(os.path.dirname(target), member.linkname)
+                    if os.path.isabs(member.linkname) or not _inside(root, link_target):
+                        continue
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    try:
+                        os.symlink(member.linkname, target)
+                    except OSError:
+                        pass
+    _drop_escaping_links(root)
+
+    if os.path.exists(dest_folder):
+        shutil.rmtree(dest_folder)
+    os.replace(work, dest_folder)
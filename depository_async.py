@@ -0,0 +1,273 @@
+"""
+depository_async.py
+asyncio download engine for runs with many ZIP downloads.
+
+Keeps up to ASYNC_CONCURRENCY archive streams in flight on one event
+loop, while git clones and extractions run on a separate thread pool.
+Needs the optional aiohttp package (pip install aiohttp); without it
+available() is False and MDepository uses its thread pool instead.
+"""
+
+import os
+import time
+import asyncio
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+import depository_archive as archive
+import depository_cache as cache
+import depository_core as core
+import depository_git as gitops
+import depository_http as http
+import depository_metrics as metrics
+import depository_scheduler as scheduler
+from depository_lazy import installed, lazy_import
+
+aiohttp = lazy_import("aiohttp")
+progress = lazy_import("depository_progress")
+
+# ──────────────────────────────────────────────
+# Constants
+# ──────────────────────────────────────────────
+
+ASYNC_ENABLED = os.environ.get("DEPOSITORY_ASYNC", "1").strip() != "0"
+ASYNC_CONCURRENCY = 128  # archive streams in flight at once
+ASYNC_MIN_JOBS = 8       # fewer ZIP jobs than this are not worth an event loop
+WRITE_BATCH_BYTES = 1024 * 1024  # received bytes handed to a writer thread at once
+
+
+def available() -> bool:
+    return ASYNC_ENABLED and installed("aiohttp")
+
+
+# ──────────────────────────────────────────────
+# Internal helpers
+# ──────────────────────────────────────────────
+
+class _LaneCounts:
+    """
+    Queued / active / completed counts of one kind of job, shaped like a
+    depository_scheduler.Lane for the Dashboard and the run estimate.
+    This engine does not tune its concurrency, so `limit` stays fixed.
+    """
+    fixed = True
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def running(self):
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
+
+
+def _lane_of(method: str) -> str:
+    """ZIP streams run on the loop; everything else on the thread pool."""
+    return "zip" if method == "zip" else "git"
+
+
+def _write_chunks(f, chunks: list[bytes]):
+    for chunk in chunks:
+        f.write(chunk)
+
+
+async def _fetch_zip(session, username: str, repo_name: str, branch: str,
+                     sha: str | None, job: metrics.Job) -> bool | None:
+    """
+    Async counterpart of depository_core.download_zip, sharing its .part
+    files and archive store. Returns None for archives that should go to
+    the threaded downloader instead (large enough to be segmented, or
+    with a segmented download already in progress). File and cache work
+    runs in threads so it never stalls the other streams on the loop.
+    """
+    local_path = os.path.join(core.OUTPUT_DIR, f"{repo_name}-{branch}.zip")
+    key = core.archive_key(repo_name, sha)
+    if key and await asyncio.to_thread(cache.restore_archive, key, local_path):
+        return True
+
+    url = core.archive_url(username, repo_name, branch, sha, "zip")
+    part = f"{local_path}.part"
+    error = None
+    for attempt in range(archive.ARCHIVE_RETRIES + 1):
+        if error is not None:
+            await asyncio.sleep(archive.retry_delay(attempt - 1))
+            job.add_retry()
+        point = await asyncio.to_thread(archive.resume_point, url, local_path)
+        if point is None:
+            return None
+        offset, headers = point
+        try:
+            started = time.monotonic()
+            async with session.get(url, headers={**http.auth_headers(),
+                                                 **headers}) as r:
+                metrics.record_request("web", "GET", url, r.status,
+                                       time.monotonic() - started)
+                if r.status == 416:
+                    await asyncio.to_thread(os.remove, part)
+                    continue
+                if r.status >= 500:
+                    error = f"HTTP {r.status}"
+                    continue
+                if r.status not in (200, 206):
+                    print(f"  [x]  ZIP download failed for '{branch}' (HTTP {r.status})")
+                    return False
+                if r.status == 200:
+                    offset = 0
+                total = offset + (r.content_length or 0)
+                if archive.wants_segments(r.status, r.headers, total):
+                    return None
+
+                await asyncio.to_thread(archive.record_part, url, local_path,
+                                        r.headers.get("ETag"))
+                f = await asyncio.to_thread(open, part, "ab" if offset else "wb")
+                try:
+                    # Hand chunks to a thread in batches of about 1 MB.
+                    batch, size = [], 0
+                    async for chunk in r.content.iter_chunked(archive.CHUNK_SIZE):
+                        batch.append(chunk)
+                        size += len(chunk)
+                        archive.count_bytes(len(chunk))
+                        job.add_bytes(len(chunk))
+                        if size >= WRITE_BATCH_BYTES:
+                            await asyncio.to_thread(_write_chunks, f, batch)
+                            batch, size = [], 0
+                    await asyncio.to_thread(_write_chunks, f, batch)
+                finally:
+                    await asyncio.to_thread(f.close)
+        except (aiohttp.ClientError, TimeoutError) as exc:
+            error = exc
+            continue
+
+        await asyncio.to_thread(archive.finish_part, local_path)
+        if key:
+            await asyncio.to_thread(cache.store_archive, key, local_path)
+        return True
+
+    print(f"  [x]  Error during ZIP download: {error}")
+    return False
+
+
+def _run_job(fn, lane: _LaneCounts, user: str, repo: str, branches: list[tuple],
+             method: str, profile) -> tuple[dict[str, bool], float]:
+    """Run a threaded download task under its own metrics job."""
+    with lane.running(), \
+            metrics.job(user, repo, [b for b, _ in branches], method) as job:
+        outcome = fn(user, repo, branches, method, profile)
+        job.finish(all(outcome.get(b) for b, _ in branches))
+    return outcome, job.seconds
+
+
+def _download_bound(job: metrics.Job, *args) -> bool:
+    """core.download_zip for a ZIP the event loop handed over to a thread."""
+    with metrics.bind(job):
+        return core.download_zip(*args)
+
+
+async def _run(tasks: list[tuple], workers: int,
+               lanes: dict[str, _LaneCounts]) -> tuple[dict, list]:
+    """
+    Run `tasks` with a live Dashboard. Returns ({(repo_name, branch): ok},
+    [(task, seconds)] of fully successful tasks).
+    """
+    loop = asyncio.get_running_loop()
+    limit = asyncio.Semaphore(ASYNC_CONCURRENCY)
+    connector = aiohttp.TCPConnector(limit=ASYNC_CONCURRENCY)
+    timeout = aiohttp.ClientTimeout(total=None,
+                                    sock_connect=http.REQUEST_TIMEOUT,
+                                    sock_read=http.REQUEST_TIMEOUT)
+    results = {}
+    finished = []
+
+    with ThreadPoolExecutor(max_workers=workers) as executor, \
+            progress.Dashboard(lanes, scheduler.LANE_TITLES, len(tasks)) as board:
+        submodules = scheduler.SubmoduleJobs(executor.submit, core.OUTPUT_DIR, board)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                         headers={"User-Agent": "Depository"}) as session:
+
+            async def run_task(user, repo, branches, method,
+                               profile) -> tuple[dict[str, bool], float]:
+                if method != "zip":
+                    outcome, seconds = await loop.run_in_executor(
+                        executor, _run_job, core.do_download_branches, lanes["git"],
+                        user, repo, branches, method, profile)
+                    await loop.run_in_executor(
+                        executor, submodules.add_clone,
+                        (user, repo, branches, method, profile), outcome)
+                    return outcome, seconds
+                (branch, sha), = branches
+                async with limit:
+                    with lanes["zip"].running():
+                        job = metrics.start_job(user, repo, [branch], method)
+                        ok = await _fetch_zip(session, user, repo, branch, sha, job)
+                if ok is None:
+                    ok = await loop.run_in_executor(
+                        executor, _download_bound, job,
+                        user, repo, branch, core.OUTPUT_DIR, sha)
+                job.finish(bool(ok))
+                return {branch: ok}, job.seconds
+
+            async def guarded(task):
+                _, repo, branches, _, _ = task
+                try:
+                    outcome, seconds = await run_task(*task)
+                except Exception as exc:
+                    names = ", ".join(branch for branch, _ in branches)
+                    print(f"  [x]  {repo} [{names}] — exception: {exc}")
+                    outcome, seconds = {}, 0.0
+                return task, outcome, seconds
+
+            for next_done in asyncio.as_completed([guarded(t) for t in tasks]):
+                task, outcome, seconds = await next_done
+                _, repo, branches, _, _ = task
+                ok = all(outcome.get(branch) for branch, _ in branches)
+                if ok:
+                    finished.append((task, seconds))
+                board.job_done(ok)
+                for branch, _ in branches:
+                    results[(repo, branch)] = outcome.get(branch, False)
+            # Submodule jobs run on the same pool; wait off the event loop.
+            for ok, owners in await asyncio.to_thread(list, submodules.results()):
+                for owner in owners:
+                    results[owner] = results[owner] and ok
+    return results, finished
+
+
+# ──────────────────────────────────────────────
+# Public API
+# ──────────────────────────────────────────────
+
+def run_tasks(tasks: list[tuple], workers: int, sizes: dict | None = None,
+              notes: list[str] | None = None) -> dict[tuple, bool]:
+    """
+    Run (username, repo_name, [(branch, sha), ...], method, profile)
+    tasks, longest expected first. ZIP tasks stream on the event loop;
+    everything else runs on a pool of `workers` threads. `sizes` and
+    `notes` are as for depository_scheduler.run_tasks.
+    Returns {(repo_name, branch): ok}.
+    """
+    os.makedirs(core.OUTPUT_DIR, exist_ok=True)
+    sizes = sizes or {}
+    lanes = {"zip": _LaneCounts(ASYNC_CONCURRENCY), "git": _LaneCounts(workers)}
+    tasks, predicted, timings = scheduler.plan_run(tasks, sizes, lanes)
+    for task in tasks:
+        lanes[_lane_of(task[3])].queued += 1
+
+    started = time.monotonic()
+    clones = sum(1 for task in tasks if task[3] == "git")
+    with gitops.tuned(min(workers, clones) or 1):
+        results, finished = asyncio.run(_run(tasks, workers, lanes))
+    scheduler.finish_run(timings, finished, sizes, lanes, notes,
+                         time.monotonic() - started, predicted)
+    return results
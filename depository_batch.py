@@ -0,0 +1,335 @@
+"""
+depository_batch.py
+Headless runs driven by a JSON manifest, for cron jobs and build farms.
+
+Example manifest:
+
+    {
+      "output": "mirror",
+      "layout": "owner",
+      "method": "zip",
+      "workers": {"zip": 16, "git": 2},
+      "targets": [
+        {"owner": "SSMG4"},
+        {"owner": "python", "include": ["cpython*"], "exclude": ["*-old"],
+         "branches": ["main", "3.1*"], "method": "git",
+         "clone": {"filter": "blobless", "sparse": ["Lib", "Doc"]}}
+      ]
+    }
+
+"output" is the download folder (default "output"). "layout" is "flat"
+(every repo-branch folder side by side) or "owner" (one subfolder per
+owner). "branches" is "default" (the default), "all", or a list of
+branch names / glob patterns; "include" / "exclude" are glob patterns
+on repository names. "method" and "workers" are optional per target
+and for the whole run respectively. "clone" (per target or for the whole
+run) shapes git clones: a filter name ("full", "blobless", "treeless")
+or an object with "filter", "sparse" (directories to check out),
+"checkout" (false: no files written) and "submodules" (true: also fetch
+submodules, recursively). Optional "report" and "prometheus"
+paths say where to write the run's JSON report and Prometheus textfile.
+"""
+
+import os
+import json
+from fnmatch import fnmatch
+
+import depository_core as core
+import depository_git as gitops
+import depository_graphql as graphql
+import depository_http as http
+import depository_pipeline as pipeline
+import depository_scheduler as scheduler
+
+# ──────────────────────────────────────────────
+# Constants
+# ──────────────────────────────────────────────
+
+METHODS = ("git", "zip", "extract")
+LAYOUTS = ("flat", "owner")
+
+
+# ──────────────────────────────────────────────
+# Manifest
+# ──────────────────────────────────────────────
+
+def _manifest_error(message: str):
+    print(f"  [x]  Manifest: {message}")
+
+
+def load_manifest(path: str) -> dict | None:
+    """
+    Read and validate a manifest, filling in defaults. Returns None
+    (after printing why) if it cannot be used.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except OSError as exc:
+        _manifest_error(f"cannot read {path}: {exc}")
+        return None
+    except ValueError as exc:
+        _manifest_error(f"{path} is not valid JSON: {exc}")
+        return None
+
+    if not isinstance(manifest, dict) or not manifest.get("targets"):
+        _manifest_error("expected an object with a non-empty \"targets\" list.")
+        return None
+
+    manifest.setdefault("output", core.OUTPUT_DIR)
+    manifest.setdefault("layout", "flat")
+    manifest.setdefault("method", "zip")
+    manifest.setdefault("clone", "full")
+    workers = manifest.setdefault("workers", {})
+    if manifest["layout"] not in LAYOUTS:
+        _manifest_error(f"layout must be one of {', '.join(LAYOUTS)}.")
+        return None
+    if manifest["method"] not in METHODS:
+        _manifest_error(f"method must be one of {', '.join(METHODS)}.")
+        return None
+    if not isinstance(workers, dict) or not all(
+            lane in ("zip", "git") and isinstance(n, int) and n > 0
+            for lane, n in workers.items()):
+        _manifest_error("workers must map \"zip\" / \"git\" to positive integers.")
+        return None
+
+    for i, target in enumerate(manifest["targets"], 1):
+        if isinstance(target, str):
+            target = manifest["targets"][i - 1] = {"owner": target}
+        if not isinstance(target, dict) or not target.get("owner"):
+            _manifest_error(f"target {i} needs an \"owner\".")
+            return None
+        target.setdefault("include", ["*"])
+        target.setdefault("exclude", [])
+        target.setdefault("branches", "default")
+        target.setdefault("method", manifest["method"])
+        if target["method"] not in METHODS:
+            _manifest_error(f"target {i}: method must be one of {', '.join(METHODS)}.")
+            return None
+        target["profile"] = _clone_profile(target.get("clone", manifest["clone"]))
+        if target["profile"] is None:
+            _manifest_error(f"target {i}: clone must be one of "
+                            f"{', '.join(gitops.CLONE_FILTERS)} or an object with "
+                            "\"filter\", \"sparse\", \"checkout\" and \"submodules\".")
+            return None
+        branches = target["branches"]
+        if branches not in ("default", "all") and not (
+                isinstance(branches, list) and branches):
+            _manifest_error(f"target {i}: branches must be \"default\", \"all\" "
+                            "or a list of names/patterns.")
+            return None
+    return manifest
+
+
+def _clone_profile(spec) -> gitops.CloneProfile | None:
+    """CloneProfile from a manifest "clone" value, or None if it is invalid."""
+    if isinstance(spec, str):
+        spec = {"filter": spec}
+    if not isinstance(spec, dict) or set(spec) - {"filter", "sparse", "checkout",
+                                                  "submodules"}:
+        return None
+    sparse = spec.get("sparse", [])
+    if (spec.get("filter", "full") not in gitops.CLONE_FILTERS
+            or not isinstance(sparse, list)
+            or not all(isinstance(path, str) for path in sparse)
+            or not isinstance(spec.get("checkout", True), bool)
+            or not isinstance(spec.get("submodules", False), bool)):
+        return None
+    return gitops.make_profile(spec.get("filter", "full"), sparse,
+                               spec.get("checkout", True),
+                               spec.get("submodules", False))
+
+
+def _wants_repo(target: dict, repo: dict) -> bool:
+    name = repo["name"]
+    return (any(fnmatch(name, pattern) for pattern in target["include"])
+            and not any(fnmatch(name, pattern) for pattern in target["exclude"]))
+
+
+def _wants_branch(target: dict, name: str) -> bool:
+    if target["branches"] == "all":
+        return True
+    return any(fnmatch(name, pattern) for pattern in target["branches"])
+
+
+def _branches_label(target: dict) -> str:
+    branches = target["branches"]
+    return branches if isinstance(branches, str) else ", ".join(branches)
+
+
+def _method_label(target: dict) -> str:
+    if target["method"] != "git" or target["profile"] == gitops.FULL_CLONE:
+        return target["method"]
+    return f"git ({gitops.describe_profile(target['profile'])})"
+
+
+def _output_dir(manifest: dict, owner: str) -> str:
+    if manifest["layout"] == "owner":
+        return os.path.join(manifest["output"], owner)
+    return manifest["output"]
+
+
+# ──────────────────────────────────────────────
+# Dry run
+# ──────────────────────────────────────────────
+
+def _format_bytes(n: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024:
+            return f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} TB"
+
+
+def plan_target(target: dict) -> dict | None:
+    """
+    Cost of one target: the repositories it selects and the API calls,
+    downloads and bytes it will take. Lists the owner's repositories
+    (those calls are counted too) but fetches no branches.
+    """
+    repos = core.get_repos(target["owner"])
+    if repos is None:
+        return None
+    selected = [repo for repo in repos if _wants_repo(target, repo)]
+
+    branches = target["branches"]
+    exact = (isinstance(branches, list)
+             and not any(ch in name for name in branches for ch in "*?["))
+    per_repo = 1 if branches == "default" else len(branches) if exact else None
+
+    if branches == "default":
+        branch_calls = len(selected)
+    elif http.GITHUB_TOKEN:
+        branch_calls = -(-len(selected) // graphql.GRAPHQL_BATCH)
+    else:
+        branch_calls = len(selected)
+
+    copies = 1 if target["method"] == "git" else (per_repo or 1)
+    size = sum(repo.get("size", 0) * 1024 for repo in selected) * copies
+    return {
+        "repos": len(selected),
+        "listing_calls": max(1, -(-len(repos) // core.PAGE_SIZE)),
+        "branch_calls": branch_calls,
+        "downloads": len(selected) * (per_repo or 1),
+        "exact": per_repo is not None,
+        "bytes": size,
+    }
+
+
+def dry_run(manifest: dict) -> bool:
+    """Print what the manifest would cost without downloading anything."""
+    totals = {"api": 0, "downloads": 0, "bytes": 0}
+    exact = True
+    for target in manifest["targets"]:
+        owner = target["owner"]
+        plan = plan_target(target)
+        if plan is None:
+            print(f"  [x]  {owner}: could not list repositories.")
+            return False
+        api_calls = plan["listing_calls"] + plan["branch_calls"]
+        at_least = "" if plan["exact"] else "at least "
+        print(f"  {owner}: {plan['repos']} repo(s), {_method_label(target)}, "
+              f"branches: {_branches_label(target)}")
+        print(f"      API calls: {api_calls} ({plan['listing_calls']} listing, "
+              f"{plan['branch_calls']} branch)  ·  downloads: {at_least}"
+              f"{plan['downloads']}  ·  {at_least}~{_format_bytes(plan['bytes'])}")
+        totals["api"] += api_calls
+        totals["downloads"] += plan["downloads"]
+        totals["bytes"] += plan["bytes"]
+        exact = exact and plan["exact"]
+
+    at_least = "" if exact else "at least "
+    print(f"\n  Total: {totals['api']} API call(s), {at_least}"
+          f"{totals['downloads']} download(s), {at_least}~"
+          f"{_format_bytes(totals['bytes'])} (from repository sizes on GitHub).")
+    remaining = http.get_rate_limiter(http.api_url("/")).remaining
+    if remaining is not None:
+        print(f"  API quota left: {remaining} request(s).")
+    return True
+
+
+# ──────────────────────────────────────────────
+# Run
+# ──────────────────────────────────────────────
+
+def _run_selected_branches(target: dict, notes: list[str]) -> dict[tuple, bool]:
+    """Targets with explicit branch names/patterns or "all"."""
+    owner = target["owner"]
+    repos = core.get_repos(owner)
+    if repos is None:
+        return {(owner, core.LISTING): False}
+    selected = [repo for repo in repos if _wants_repo(target, repo)]
+    found = core.get_branches_bulk(owner, [repo["name"] for repo in selected])
+
+    jobs = []
+    failed = {}
+    for repo in selected:
+        branches = found.get(repo["name"])
+        if not branches:
+            print(f"  [!]  {repo['name']}: could not fetch branches. Skipping.")
+            if branches is None:
+                failed[(repo["name"], core.LISTING)] = False
+            continue
+        for branch in branches:
+            if _wants_branch(target, branch["name"]):
+                jobs.append((owner, repo["name"], branch["name"], target["method"],
+                             (branch.get("commit") or {}).get("sha"), target["profile"]))
+
+    sizes = {repo["name"]: repo.get("size", 0) for repo in selected}
+    results = scheduler.run_tasks(scheduler.group_jobs(jobs), sizes, notes)
+    results.update(failed)
+    return results
+
+
+def run_manifest(manifest: dict, notes: list[str] | None = None) -> dict[tuple, bool]:
+    """
+    Execute every target of the manifest, one owner after another, adding
+    each target's summary lines to `notes`. Returns {(repo_name, branch):
+    ok}; repo names are prefixed with the owner when several owners are
+    mirrored.
+    """
+    for lane, workers in manifest["workers"].items():
+        scheduler.pin_workers(lane, workers)
+    http.configure_pool(scheduler.max_workers() + pipeline.RESOLVE_WORKERS)
+
+    several = len({target["owner"] for target in manifest["targets"]}) > 1
+    results = {}
+    # The download helpers write to core.OUTPUT_DIR; point it at each
+    # owner's folder for the duration of its target only.
+    previous_output = core.OUTPUT_DIR
+    try:
+        for target in manifest["targets"]:
+            _run_target(manifest, target, several, results, notes)
+    finally:
+        core.OUTPUT_DIR = previous_output
+    return results
+
+
+def _run_target(manifest: dict, target: dict, several: bool,
+                results: dict, notes: list[str] | None):
+    """Run one manifest target, adding its outcomes to `results`."""
+    owner = target["owner"]
+    core.OUTPUT_DIR = _output_dir(manifest, owner)
+    os.makedirs(core.OUTPUT_DIR, exist_ok=True)
+    core.section(f"{owner}  ({_method_label(target)}, branches: "
+                 f"{_branches_label(target)})")
+
+    target_notes = []
+    if target["branches"] == "default":
+        outcome = pipeline.mirror_default_branches(
+            owner, target["method"], target_notes,
+            repo_filter=lambda repo, t=target: _wants_repo(t, repo),
+            profile=target["profile"])
+    else:
+        outcome = _run_selected_branches(target, target_notes)
+    for note in target_notes:
+        print(f"  {note}")
+    if notes is not None:
+        notes.extend(f"{owner}: {note}" for note in target_notes)
+
+    for (repo_name, branch), ok in outcome.items():
+        if (repo_name, branch) == (owner, core.LISTING):
+            key = owner                     # the owner's repository listing
+        else:
+            key = f"{owner}/{repo_name}" if several else repo_name
+        results[(key, branch)] = ok
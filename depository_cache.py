@@ -0,0 +1,334 @@
+"""
+depository_cache.py
+Persistent on-disk caches shared by Depository and MDepository:
+API responses with their ETags, downloaded archives by commit SHA, and
+how long past downloads took, and the last update check.
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import atexit
+import shutil
+import hashlib
+import threading
+
+from depository_lazy import lazy_import
+
+requests = lazy_import("requests")
+
+
+# ──────────────────────────────────────────────
+# Constants
+# ──────────────────────────────────────────────
+
+CACHE_DIR = (os.environ.get("DEPOSITORY_CACHE_DIR", "").strip()
+             or os.path.expanduser("~/.depository_cache"))
+
+HTTP_CACHE_DIR = os.path.join(CACHE_DIR, "http")
+HTTP_CACHE_ENABLED = os.environ.get("DEPOSITORY_HTTP_CACHE", "1").strip() != "0"
+HTTP_CACHE_TTL = 7 * 24 * 3600          # seconds an unused entry is kept
+HTTP_CACHE_MAX_BYTES = 64 * 1024 * 1024  # total size before LRU eviction
+HTTP_CACHE_PRUNE_EVERY = 50              # stores between eviction passes
+
+ARCHIVE_CACHE_DIR = os.path.join(CACHE_DIR, "archives")
+ARCHIVE_CACHE_ENABLED = os.environ.get("DEPOSITORY_ARCHIVE_CACHE", "1").strip() != "0"
+ARCHIVE_CACHE_MAX_BYTES = 10 * 1024 ** 3  # total size before LRU eviction
+ARCHIVE_CACHE_PRUNE_BYTES = 1024 ** 3     # bytes stored between eviction passes
+
+TIMINGS_FILE = os.path.join(CACHE_DIR, "timings.json")
+TIMINGS_MAX_ENTRIES = 5000               # repositories remembered
+
+UPDATE_CHECK_FILE = os.path.join(CACHE_DIR, "update_check.json")
+
+# Response headers worth replaying on a 304. Not Link: the ETag covers
+# the body only, so pagination must come from the live response.
+_REPLAYED_HEADERS = ("Content-Type",)
+
+_stores_since_prune = 0
+_archive_bytes_since_prune = 0
+_prune_lock = threading.Lock()
+
+
+# ──────────────────────────────────────────────
+# Internal helpers
+# ──────────────────────────────────────────────
+
+def _entry_path(url: str) -> str:
+    digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    return os.path.join(HTTP_CACHE_DIR, digest[:2], f"{digest}.json")
+
+
+def _atomic_write(path: str, content: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+def _link_or_copy(src: str, dst: str):
+    """Hard-link `src` to `dst` (copy across filesystems), replacing `dst`."""
+    os.makedirs(os.path.dirname(os.path.abspath(dst)), exist_ok=True)
+    tmp = f"{dst}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copy2(src, tmp)
+    os.replace(tmp, dst)
+
+
+def _lru_evict(entries: list[tuple[float, int, str]], max_bytes: int):
+    """Remove the oldest (mtime, size, path) entries until under `max_bytes`."""
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        _remove_quietly(path)
+        total -= size
+
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# ──────────────────────────────────────────────
+# HTTP metadata cache (ETag / Last-Modified)
+# ──────────────────────────────────────────────
+
+def load_http_entry(url: str) -> dict | None:
+    """Return the cached entry for `url`, or None if missing or expired."""
+    if not HTTP_CACHE_ENABLED:
+        return None
+    path = _entry_path(url)
+    try:
+        if time.time() - os.path.getmtime(path) > HTTP_CACHE_TTL:
+            os.remove(path)
+            return None
+        with open(path, encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if entry.get("url") != url:
+        return None
+    return entry
+
+
+def conditional_headers(entry: dict | None) -> dict:
+    """If-None-Match / If-Modified-Since headers for a cached entry."""
+    if not entry:
+        return {}
+    headers = {}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+def store_http_entry(url: str, resp: requests.Response):
+    """Cache a 200 response if it carries a validator."""
+    global _stores_since_prune
+    if not HTTP_CACHE_ENABLED:
+        return
+    etag = resp.headers.get("ETag")
+    last_modified = resp.headers.get("Last-Modified")
+    if not etag and not last_modified:
+        return
+    entry = {
+        "url": url,
+        "etag": etag,
+        "last_modified": last_modified,
+        "headers": {k: resp.headers[k] for k in _REPLAYED_HEADERS
+                    if k in resp.headers},
+        "body": resp.text,
+    }
+    try:
+        _atomic_write(_entry_path(url), json.dumps(entry))
+    except OSError:
+        return
+
+    with _prune_lock:
+        _stores_since_prune += 1
+        if _stores_since_prune < HTTP_CACHE_PRUNE_EVERY:
+            return
+        _stores_since_prune = 0
+    prune_http_cache()
+
+
+def replay_http_entry(entry: dict, not_modified: requests.Response) -> requests.Response:
+    """
+    Build a 200 response from a cached entry after the server answered 304.
+    Marks the entry as recently used.
+    """
+    try:
+        os.utime(_entry_path(entry["url"]))
+    except OSError:
+        pass
+
+    resp = requests.Response()
+    resp.status_code = 200
+    resp.url = entry["url"]
+    resp.encoding = "utf-8"
+    resp._content = entry["body"].encode("utf-8")
+    # Live headers last: they describe the current state (Link, rate limit).
+    resp.headers.update(entry.get("headers", {}))
+    resp.headers.update(not_modified.headers)
+    resp.request = not_modified.request
+    resp.from_cache = True
+    return resp
+
+
+def prune_http_cache():
+    """Drop expired entries, then evict least recently used ones over the size cap."""
+    entries = []
+    now = time.time()
+    try:
+        shards = list(os.scandir(HTTP_CACHE_DIR))
+    except OSError:
+        return
+    for shard in shards:
+        if not shard.is_dir():
+            continue
+        for item in os.scandir(shard.path):
+            try:
+                st = item.stat()
+            except OSError:
+                continue
+            if now - st.st_mtime > HTTP_CACHE_TTL:
+                _remove_quietly(item.path)
+            else:
+                entries.append((st.st_mtime, st.st_size, item.path))
+
+    _lru_evict(entries, HTTP_CACHE_MAX_BYTES)
+
+
+# ──────────────────────────────────────────────
+# Archive store (keyed by commit SHA)
+# ──────────────────────────────────────────────
+
+def _archive_path(key: str) -> str:
+    return os.path.join(ARCHIVE_CACHE_DIR, key[-2:], f"{key}.zip")
+
+
+def restore_archive(key: str, dest: str) -> bool:
+    """
+    Place the cached archive for `key` at `dest` (hard link, or copy
+    across filesystems). Returns False on a cache miss.
+    """
+    if not ARCHIVE_CACHE_ENABLED:
+        return False
+    path = _archive_path(key)
+    try:
+        os.utime(path)
+        if not (os.path.exists(dest) and os.path.samefile(path, dest)):
+            _link_or_copy(path, dest)
+        return True
+    except OSError:
+        return False
+
+
+def store_archive(key: str, src: str):
+    """
+    Add a downloaded archive to the store. The store is trimmed to size
+    once every ARCHIVE_CACHE_PRUNE_BYTES added and when the process exits,
+    not after every archive.
+    """
+    global _archive_bytes_since_prune
+    if not ARCHIVE_CACHE_ENABLED:
+        return
+    try:
+        _link_or_copy(src, _archive_path(key))
+        size = os.path.getsize(src)
+    except OSError:
+        return
+
+    with _prune_lock:
+        _archive_bytes_since_prune += size
+        if _archive_bytes_since_prune < ARCHIVE_CACHE_PRUNE_BYTES:
+            return
+        _archive_bytes_since_prune = 0
+    prune_archive_cache()
+
+
+def prune_archive_cache():
+    """Evict least recently used archives over ARCHIVE_CACHE_MAX_BYTES."""
+    entries = []
+    for root, _, files in os.walk(ARCHIVE_CACHE_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+    _lru_evict(entries, ARCHIVE_CACHE_MAX_BYTES)
+
+
+def _prune_stored_archives():
+    """Last eviction pass for archives stored since the previous one."""
+    if _archive_bytes_since_prune:
+        prune_archive_cache()
+
+
+atexit.register(_prune_stored_archives)
+
+
+# ──────────────────────────────────────────────
+# Download timings
+# ──────────────────────────────────────────────
+
+def load_timings() -> dict:
+    """
+    Past download durations, as written by save_timings:
+    {"jobs": {"user/repo": {method: seconds per branch}},
+     "rates": {method: bytes per second}}.
+    """
+    try:
+        with open(TIMINGS_FILE, encoding="utf-8") as f:
+            timings = json.load(f)
+    except (OSError, ValueError):
+        timings = {}
+    timings.setdefault("jobs", {})
+    timings.setdefault("rates", {})
+    return timings
+
+
+def save_timings(timings: dict):
+    """Persist `timings`, keeping only the most recently updated entries."""
+    jobs = timings["jobs"]
+    for key in list(jobs)[:max(0, len(jobs) - TIMINGS_MAX_ENTRIES)]:
+        del jobs[key]
+    try:
+        _atomic_write(TIMINGS_FILE, json.dumps(timings))
+    except OSError:
+        pass
+
+
+# ──────────────────────────────────────────────
+# Update check
+# ──────────────────────────────────────────────
+
+def load_update_check() -> dict:
+    """
+    The last update check, as written by save_update_check:
+    {"checked_at": unix time, "etag": ..., "release": {...}}.
+    """
+    try:
+        with open(UPDATE_CHECK_FILE, encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return state if isinstance(state, dict) else {}
+
+
+def save_update_check(state: dict):
+    try:
+        _atomic_write(UPDATE_CHECK_FILE, json.dumps(state))
+    except OSError:
+        pass
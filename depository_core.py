@@ -3,15 +3,28 @@ depository_core.py
 Shared utilities for Depository and MDepository.
 """
 
+from __future__ import annotations
+
 import os
 import sys
-import stat
+import time
 import shutil
+import hashlib
 import atexit
-import requests
-import webbrowser
-from git import Repo, GitCommandError
-from tqdm import tqdm
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import parse_qs, quote, urlparse
+
+import depository_archive as archive
+import depository_cache as cache
+import depository_git as gitops
+import depository_graphql as graphql
+import depository_http as http
+from depository_lazy import lazy_import
+
+git = lazy_import("git")
+requests = lazy_import("requests")
+webbrowser = lazy_import("webbrowser")
 
 # ──────────────────────────────────────────────
 # Constants
@@ -21,29 +34,55 @@ OUTPUT_DIR = "output"
 UPDATE_CHECK_URL = "https://api.github.com/repos/SSMG4/Depository/releases/latest"
 CURRENT_VERSION = "official-release_v2.0"
 UPDATE_CHECK_INTERVAL = 3600  # seconds (1 hour)
+UPDATE_CHECK_TIMEOUT = 10     # seconds; the check runs in the background anyway
+
+PAGE_SIZE = 100    # items per API listing page (GitHub maximum)
+PAGE_WORKERS = 8   # concurrent page fetches for large listings
+PREFETCH_WORKERS = 4  # background branch fetches while the user is selecting
+
+# Branch name under which a failed listing is reported in download
+# results: {(owner, LISTING): False} when an owner's repositories could
+# not be listed, {(repo_name, LISTING): False} for a repository's branches.
+LISTING = "*"
 
-# Optional GitHub personal access token.
-# Get one at: https://github.com/settings/tokens  (no scopes needed for public repos)
-_GITHUB_TOKEN = os.environ.get("GITHUB_TOKEN_DEPOSITORY", "").strip()
+# Opt-in: clone every repository of one fork network into a single shared
+# object store (output/.depository/shared) so forks and branches of the
+# same upstream keep one copy of their common objects.
+SHARED_OBJECT_STORE = os.environ.get("DEPOSITORY_SHARED_STORE", "").strip() == "1"
+
+# Submodule URLs that are followed; file paths and git's ext:: helper are not.
+SUBMODULE_SCHEMES = ("https://", "http://", "ssh://", "git://", "git@")
+
+# Optional GitHub personal access token (see depository_http).
+_GITHUB_TOKEN = http.GITHUB_TOKEN
 
 REMINDER_FILE = os.path.expanduser("~/.depository_update_reminder")
 IGNORE_FILE   = os.path.expanduser("~/.depository_ignored_version")
 
+# Folders (relative to the scripts) whose __pycache__ is removed on exit.
+PYCACHE_DIRS = ("", "benchmarks")
+
+_update_check: Future | None = None
+_update_check_started: float | None = None
+
 # ──────────────────────────────────────────────
 # __pycache__ cleanup
 # ──────────────────────────────────────────────
 
 def cleanup_pycache():
-    """Remove __pycache__ folders next to the scripts."""
+    """
+    Remove the __pycache__ folders of the tool's own scripts. Only the
+    known folders are checked, so exit never walks the download output.
+    """
     base = os.path.dirname(os.path.abspath(__file__))
-    for root, dirs, _ in os.walk(base):
-        for d in dirs:
-            if d == "__pycache__":
-                target = os.path.join(root, d)
-                try:
-                    shutil.rmtree(target, onerror=_force_remove_readonly)
-                except OSError:
-                    pass
+    for folder in PYCACHE_DIRS:
+        target = os.path.join(base, folder, "__pycache__")
+        if not os.path.isdir(target):
+            continue
+        try:
+            shutil.rmtree(target, onerror=gitops.force_remove_readonly)
+        except OSError:
+            pass
 
 atexit.register(cleanup_pycache)
 
@@ -51,23 +90,24 @@ atexit.register(cleanup_pycache)
 # Internal helpers
 # ──────────────────────────────────────────────
 
-def _force_remove_readonly(func, path, _):
-    """onerror handler for shutil.rmtree — strips read-only on Windows then retries."""
-    try:
-        os.chmod(path, stat.S_IWRITE)
-        func(path)
-    except Exception:
-        pass
-
-
-def _auth_headers() -> dict:
-    if _GITHUB_TOKEN:
-        return {"Authorization": f"Bearer {_GITHUB_TOKEN}"}
-    return {}
+def _get(url: str, **kwargs) -> requests.Response:
+    """GET through the shared keep-alive session with auth headers."""
+    return http.get(url, headers=http.auth_headers(), **kwargs)
 
 
-def _get(url: str, **kwargs) -> requests.Response:
-    return requests.get(url, headers=_auth_headers(), timeout=15, **kwargs)
+def _get_cached(url: str) -> requests.Response:
+    """
+    Conditional GET for API metadata. Replays the on-disk copy when the
+    server answers 304 Not Modified (which does not cost rate limit).
+    """
+    entry = cache.load_http_entry(url)
+    headers = {**http.auth_headers(), **cache.conditional_headers(entry)}
+    resp = http.get(url, headers=headers)
+    if resp.status_code == 304 and entry:
+        return cache.replay_http_entry(entry, resp)
+    if resp.status_code == 200:
+        cache.store_http_entry(url, resp)
+    return resp
 
 
 # ──────────────────────────────────────────────
@@ -118,14 +158,50 @@ def section(title: str = ""):
 # Update checker
 # ──────────────────────────────────────────────
 
-def _get_latest_release() -> dict | None:
+def _get_latest_release(state: dict) -> dict | None:
+    """
+    Revalidate the cached release with its ETag (a 304 costs no rate
+    limit) and save the result with a new timestamp. Falls back to the
+    cached release when offline.
+    """
+    headers = http.auth_headers()
+    if state.get("etag"):
+        headers["If-None-Match"] = state["etag"]
     try:
-        resp = _get(UPDATE_CHECK_URL)
+        resp = http.get(UPDATE_CHECK_URL, headers=headers, timeout=UPDATE_CHECK_TIMEOUT)
         if resp.status_code == 200:
-            return resp.json()
+            release = resp.json()
+            state = {
+                "etag": resp.headers.get("ETag"),
+                "release": {key: release.get(key)
+                            for key in ("tag_name", "name", "body", "html_url")},
+            }
+        elif resp.status_code != 304:
+            return state.get("release")
     except Exception:
-        pass
-    return None
+        return state.get("release")
+    state["checked_at"] = time.time()
+    cache.save_update_check(state)
+    return state.get("release")
+
+
+def _start_update_check() -> Future:
+    """
+    Future for the latest release: answered from disk if it was checked
+    less than UPDATE_CHECK_INTERVAL ago (even by an earlier run),
+    otherwise fetched on a background thread.
+    """
+    future = Future()
+    state = cache.load_update_check()
+    if time.time() - state.get("checked_at", 0) < UPDATE_CHECK_INTERVAL:
+        future.set_result(state.get("release"))
+        return future
+
+    def check():
+        future.set_result(_get_latest_release(state))
+
+    threading.Thread(target=check, name="update-check", daemon=True).start()
+    return future
 
 
 def _should_remind(latest_version: str) -> bool:
@@ -151,10 +227,7 @@ def _write_file(path: str, content: str):
         pass
 
 
-def check_for_update():
-    release = _get_latest_release()
-    if not release:
-        return
+def _offer_update(release: dict):
     latest = release.get("tag_name") or release.get("name", "")
     if not latest or latest == CURRENT_VERSION:
         return
@@ -192,119 +265,281 @@ def check_for_update():
             print("  Please enter y, n, i, or x.")
 
 
+def check_for_update():
+    """
+    Call at the top of the main loop. Starts an update check at most every
+    UPDATE_CHECK_INTERVAL and offers the new version once a check has
+    finished; never waits for the network.
+    """
+    global _update_check, _update_check_started
+    if _update_check is None:
+        if (_update_check_started is not None
+                and time.monotonic() - _update_check_started < UPDATE_CHECK_INTERVAL):
+            return
+        _update_check_started = time.monotonic()
+        _update_check = _start_update_check()
+    if not _update_check.done():
+        return
+    release, _update_check = _update_check.result(), None
+    if release:
+        _offer_update(release)
+
+
 # ──────────────────────────────────────────────
 # GitHub API
 # ──────────────────────────────────────────────
 
-def get_repos(username: str) -> list | None:
-    """Return ALL public repos for a GitHub user/org (handles pagination)."""
-    repos = []
-    page = 1
+def _fetch_page(url: str, not_found: str,
+                rate_limited: str) -> tuple[list | None, requests.Response | None, str]:
+    """
+    Fetch one listing page. Returns (items, response, error); on failure
+    items is None and error holds the message to show the user.
+    """
+    try:
+        resp = _get_cached(url)
+    except requests.RequestException as exc:
+        return None, None, f"  Network error: {exc}"
+
+    if resp.status_code == 404:
+        return None, resp, not_found
+    if resp.status_code == 403:
+        return None, resp, rate_limited
+    if resp.status_code != 200:
+        return None, resp, f"  Unexpected API error: HTTP {resp.status_code}"
+    return resp.json(), resp, ""
+
+
+def _last_page(resp: requests.Response) -> int | None:
+    """Page number from the Link: rel="last" header, if the server sent one."""
+    last_url = resp.links.get("last", {}).get("url")
+    if not last_url:
+        return None
+    pages = parse_qs(urlparse(last_url).query).get("page")
+    if pages and pages[0].isdigit():
+        return int(pages[0])
+    return None
+
+
+def _iter_pages(path: str, not_found: str, rate_limited: str):
+    """
+    Yield the items of a paginated listing page by page, as soon as each
+    page arrives. The first page's Link header tells us the last page
+    number (a 304 carries a live one too), and pages up to it are fetched
+    concurrently and yielded in order. After that, or without a Link
+    header, pages are walked one by one while they are full, so a listing
+    that grew since (or a stale last page) does not cut it short. On failure the
+    error is printed and None is yielded as the last value.
+    """
+    def page_url(page: int) -> str:
+        return http.api_url(f"{path}?per_page={PAGE_SIZE}&page={page}")
+
+    items, resp, error = _fetch_page(page_url(1), not_found, rate_limited)
+    if items is None:
+        print(error)
+        yield None
+        return
+    yield items
+    if len(items) < PAGE_SIZE:
+        return
+
+    last = _last_page(resp)
+    page = 2
+    if last is not None and last >= 2:
+        workers = min(PAGE_WORKERS, last - 1)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pages = pool.map(
+                lambda page: _fetch_page(page_url(page), not_found, rate_limited),
+                range(2, last + 1),
+            )
+            for page_data, _, error in pages:
+                if page_data is None:
+                    print(error)
+                    yield None
+                    return
+                yield page_data
+        if len(page_data) < PAGE_SIZE:
+            return
+        page = last + 1
+
     while True:
-        url = (f"https://api.github.com/users/{username}/repos"
-               f"?per_page=100&page={page}")
-        try:
-            resp = _get(url)
-        except requests.RequestException as exc:
-            print(f"  Network error: {exc}")
-            return None
+        page_data, _, error = _fetch_page(page_url(page), not_found, rate_limited)
+        if page_data is None:
+            print(error)
+            yield None
+            return
+        yield page_data
+        if len(page_data) < PAGE_SIZE:
+            return
+        page += 1
 
-        if resp.status_code == 404:
-            print(f"  User '{username}' not found.")
-            return None
-        if resp.status_code == 403:
-            print("  API rate limit reached. Set GITHUB_TOKEN_DEPOSITORY to "
-                  "raise the limit to 5,000 requests/hour.")
-            return None
-        if resp.status_code != 200:
-            print(f"  Unexpected API error: HTTP {resp.status_code}")
+
+def _get_all_pages(path: str, not_found: str, rate_limited: str) -> list | None:
+    """Return every item of a paginated listing, or None on failure."""
+    items = []
+    for page in _iter_pages(path, not_found, rate_limited):
+        if page is None:
             return None
+        items.extend(page)
+    return items
 
-        page_data = resp.json()
-        if not page_data:
-            break
-        repos.extend(page_data)
-        if len(page_data) < 100:
-            break
-        page += 1
 
-    return repos
+_REPOS_RATE_LIMITED = ("  API rate limit reached. Set GITHUB_TOKEN_DEPOSITORY to "
+                       "raise the limit to 5,000 requests/hour.")
+
+
+def get_repos(username: str) -> list | None:
+    """
+    Return ALL public repos for a GitHub user/org (handles pagination).
+    With a token, GraphQL lists them a page at a time and brings their
+    branches along for get_branches_bulk; REST pages otherwise.
+    """
+    repos = graphql.get_repos(username)
+    if repos is not None:
+        return repos
+    return _get_all_pages(
+        f"/users/{username}/repos",
+        not_found=f"  User '{username}' not found.",
+        rate_limited=_REPOS_RATE_LIMITED,
+    )
+
+
+def iter_repos(username: str):
+    """
+    Yield the public repos of a user/org one API page (list) at a time,
+    as the pages arrive. Yields None after printing an error on failure.
+    """
+    return _iter_pages(
+        f"/users/{username}/repos",
+        not_found=f"  User '{username}' not found.",
+        rate_limited=_REPOS_RATE_LIMITED,
+    )
 
 
 def get_branches(username: str, repo_name: str) -> list | None:
     """Return all branches for a repository."""
-    branches = []
-    page = 1
-    while True:
-        url = (f"https://api.github.com/repos/{username}/{repo_name}/branches"
-               f"?per_page=100&page={page}")
-        try:
-            resp = _get(url)
-        except requests.RequestException as exc:
-            print(f"  Network error: {exc}")
-            return None
+    return _get_all_pages(
+        f"/repos/{username}/{repo_name}/branches",
+        not_found=f"  Repository '{repo_name}' not found under '{username}'.",
+        rate_limited="  API rate limit reached.",
+    )
 
-        if resp.status_code == 404:
-            print(f"  Repository '{repo_name}' not found under '{username}'.")
-            return None
-        if resp.status_code == 403:
-            print("  API rate limit reached.")
-            return None
-        if resp.status_code != 200:
-            print(f"  Unexpected API error: HTTP {resp.status_code}")
-            return None
 
-        page_data = resp.json()
-        if not page_data:
-            break
-        branches.extend(page_data)
-        if len(page_data) < 100:
-            break
-        page += 1
+def get_branch(username: str, repo_name: str, branch: str) -> dict | None:
+    """Return one branch ({"name", "commit": {"sha"}}), or None if missing."""
+    try:
+        resp = _get_cached(http.api_url(
+            f"/repos/{username}/{repo_name}/branches/{quote(branch, safe='')}"))
+    except requests.RequestException as exc:
+        print(f"  Network error: {exc}")
+        return None
+    if resp.status_code != 200:
+        return None
+    return resp.json()
+
+
+def get_branches_bulk(username: str, repo_names: list[str]) -> dict[str, list | None]:
+    """
+    Return {repo_name: branches} for many repositories. Uses a handful of
+    batched GraphQL queries when a token is set, one REST listing per
+    repository otherwise. Failed repositories map to None.
+    """
+    result = graphql.get_branches_bulk(username, repo_names)
+    if result is not None:
+        return result
+    return {name: get_branches(username, name) for name in repo_names}
+
 
-    return branches
+def prefetch_branches(username: str, repo_names: list[str]) -> dict[str, Future]:
+    """
+    Start fetching branches for every repository in the background and
+    return {repo_name: Future}. Futures resolve to the branch list (None
+    on failure) in roughly the given order, GraphQL batch by batch when a
+    token is set, one REST listing per repository otherwise.
+    """
+    futures = {name: Future() for name in repo_names}
+    batch_size = graphql.GRAPHQL_BATCH if http.GITHUB_TOKEN else 1
+
+    def fetch(batch: list[str]):
+        try:
+            result = get_branches_bulk(username, batch)
+        except Exception:
+            result = {}
+        for name in batch:
+            futures[name].set_result(result.get(name))
+
+    pool = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS,
+                              thread_name_prefix="prefetch")
+    for start in range(0, len(repo_names), batch_size):
+        pool.submit(fetch, repo_names[start:start + batch_size])
+    pool.shutdown(wait=False)
+    return futures
 
 
 # ──────────────────────────────────────────────
 # Download functions
 # ──────────────────────────────────────────────
 
+def archive_url(username: str, repo_name: str, branch: str,
+                sha: str | None, ext: str) -> str:
+    """Archive URL of the commit `sha`, or of the branch head if unknown."""
+    ref = sha or f"refs/heads/{branch}"
+    return http.web_url(f"/{username}/{repo_name}/archive/{ref}.{ext}")
+
+
+def archive_key(repo_name: str, sha: str | None) -> str | None:
+    """Archive store key; archives of one commit are identical across branches."""
+    return f"{repo_name}-{sha}" if sha else None
+
+
 def download_zip(username: str, repo_name: str, branch: str,
-                 dest_folder: str) -> bool:
-    zip_url = (f"https://github.com/{username}/{repo_name}"
-               f"/archive/refs/heads/{branch}.zip")
+                 dest_folder: str, sha: str | None = None) -> bool:
+    """
+    Download a branch archive. Interrupted downloads leave a '.part' file
+    that is resumed on retry or on the next run; large archives are
+    fetched over several connections when the server allows it.
+
+    When the branch head `sha` is known the archive of that commit is
+    requested instead, and kept in the archive store so any branch or
+    later run pointing at the same commit reuses it without downloading.
+    """
     local_path = os.path.join(dest_folder, f"{repo_name}-{branch}.zip")
-    try:
-        with _get(zip_url, stream=True) as r:
-            if r.status_code != 200:
-                print(f"  [x]  ZIP download failed for '{branch}' (HTTP {r.status_code})")
-                return False
-            total = int(r.headers.get("content-length", 0))
-            with open(local_path, "wb") as f, tqdm(
-                total=total, unit="B", unit_scale=True,
-                desc=f"  {repo_name} [{branch}]", leave=True
-            ) as bar:
-                for chunk in r.iter_content(chunk_size=65536):
-                    if chunk:
-                        f.write(chunk)
-                        bar.update(len(chunk))
+    key = archive_key(repo_name, sha)
+    if key and cache.restore_archive(key, local_path):
+        print(f"  {repo_name} [{branch}] reused cached archive of {sha[:7]}.")
         return True
+
+    zip_url = archive_url(username, repo_name, branch, sha, "zip")
+    try:
+        archive.fetch_archive(zip_url, local_path,
+                              desc=f"  {repo_name} [{branch}]")
+    except archive.ArchiveHTTPError as exc:
+        print(f"  [x]  ZIP download failed for '{branch}' (HTTP {exc.status_code})")
+        return False
     except Exception as exc:
         print(f"  [x]  Error during ZIP download: {exc}")
         return False
+    if key:
+        cache.store_archive(key, local_path)
+    return True
 
 
 def clone_branch(username: str, repo_name: str, branch: str,
-                 dest_folder: str) -> bool:
-    repo_url = f"https://github.com/{username}/{repo_name}.git"
+                 dest_folder: str, sha: str | None = None,
+                 profile: gitops.CloneProfile | None = None) -> bool:
+    """
+    Shallow-clone a branch into '{repo_name}-{branch}'. An existing clone
+    is skipped when already at `sha` (the branch head from get_branches)
+    and otherwise updated in place instead of being cloned again.
+    `profile` selects a partial / sparse / no-checkout clone.
+    """
+    repo_url = http.web_url(f"/{username}/{repo_name}.git")
     branch_folder = os.path.join(dest_folder, f"{repo_name}-{branch}")
     try:
-        if os.path.exists(branch_folder):
-            shutil.rmtree(branch_folder, onerror=_force_remove_readonly)
-        print(f"  Cloning {repo_name} [{branch}]...")
-        Repo.clone_from(repo_url, branch_folder, branch=branch, depth=1)
+        gitops.sync_branch(repo_url, branch, branch_folder, sha=sha,
+                            label=f"{repo_name} [{branch}]",
+                            profile=profile or gitops.FULL_CLONE)
         return True
-    except GitCommandError as exc:
+    except git.GitCommandError as exc:
         print(f"  [x]  Git clone failed: {exc}")
         return False
     except Exception as exc:
@@ -312,27 +547,243 @@ def clone_branch(username: str, repo_name: str, branch: str,
         return False
 
 
+_network_cache: dict[str, str] = {}
+
+
+def get_repo_network(username: str, repo_name: str) -> str:
+    """
+    'owner/name' of the root of the fork network a repository belongs to.
+    Falls back to the repository itself if the API cannot tell.
+    """
+    full_name = f"{username}/{repo_name}"
+    if full_name not in _network_cache:
+        network = full_name
+        try:
+            resp = _get_cached(http.api_url(f"/repos/{full_name}"))
+            if resp.status_code == 200:
+                network = (resp.json().get("source") or {}).get("full_name", full_name)
+        except requests.RequestException:
+            pass
+        _network_cache[full_name] = network
+    return _network_cache[full_name]
+
+
+def clone_branches(username: str, repo_name: str, branches: list[tuple],
+                   dest_folder: str,
+                   profile: gitops.CloneProfile | None = None) -> dict[str, bool]:
+    """
+    Clone several branches of one repository with a single fetch.
+    `branches` is a list of (branch, sha) pairs. The objects live in one
+    store under '{dest_folder}/.depository/' (shared by the whole fork
+    network when SHARED_OBJECT_STORE is on) and every branch is checked
+    out as a worktree in '{repo_name}-{branch}'. Returns {branch: ok}.
+    """
+    repo_url = http.web_url(f"/{username}/{repo_name}.git")
+    if SHARED_OBJECT_STORE:
+        network = get_repo_network(username, repo_name).replace("/", "__")
+        store = os.path.join(dest_folder, ".depository", "shared", f"{network}.git")
+        namespace = f"{username}/{repo_name}"
+    else:
+        store = os.path.join(dest_folder, ".depository", f"{repo_name}.git")
+        namespace = "origin"
+    targets = {
+        branch: (os.path.join(dest_folder, f"{repo_name}-{branch}"), sha)
+        for branch, sha in branches
+    }
+    try:
+        return gitops.sync_worktrees(repo_url, store, targets, label=repo_name,
+                                     namespace=namespace,
+                                     profile=profile or gitops.FULL_CLONE)
+    except git.GitCommandError as exc:
+        print(f"  [x]  Git fetch failed: {exc}")
+    except Exception as exc:
+        print(f"  [x]  Unexpected error: {exc}")
+    return {branch: False for branch, _ in branches}
+
+
+def find_submodules(folder: str, repo_url: str) -> list[tuple]:
+    """
+    (url, commit, folder) for each submodule of the checkout in `folder`,
+    whose origin is `repo_url`. Only network URLs are followed, so a
+    .gitmodules file cannot point git at local paths.
+    """
+    try:
+        found = gitops.list_submodules(folder, repo_url)
+    except git.GitCommandError as exc:
+        print(f"  [x]  Could not read the submodules of {folder}: {exc}")
+        return []
+    submodules = []
+    for sub in found:
+        if not sub.url.startswith(SUBMODULE_SCHEMES):
+            print(f"  [!]  Skipping submodule {sub.path}: unsupported URL {sub.url}")
+            continue
+        submodules.append((sub.url, sub.commit, os.path.join(folder, sub.path)))
+    return submodules
+
+
+def branch_submodules(username: str, repo_name: str, branch: str,
+                      dest_folder: str) -> list[tuple]:
+    """find_submodules for the clone of `branch` in `dest_folder`."""
+    return find_submodules(os.path.join(dest_folder, f"{repo_name}-{branch}"),
+                           http.web_url(f"/{username}/{repo_name}.git"))
+
+
+def fetch_submodule(url: str, commit: str, folders: list[str], dest_folder: str,
+                    profile: gitops.CloneProfile | None = None) -> bool:
+    """
+    Shallow-fetch `commit` of the submodule at `url` and check it out in
+    each of `folders`. Each URL gets one object store under
+    '{dest_folder}/.depository/submodules/', so a submodule used by
+    several repositories is downloaded once.
+    """
+    name = url.rstrip("/").rsplit("/", 1)[-1].removesuffix(".git")
+    digest = hashlib.sha1(url.encode()).hexdigest()[:8]
+    store = os.path.join(dest_folder, ".depository", "submodules", f"{name}-{digest}.git")
+    label = f"{name} @ {commit[:7]}"
+    try:
+        gitops.sync_submodule(url, commit, store, folders, label=label,
+                              clone_filter=profile.filter if profile else None)
+        return True
+    except git.GitCommandError as exc:
+        print(f"  [x]  Submodule {label} failed: {exc}")
+    except Exception as exc:
+        print(f"  [x]  Unexpected error: {exc}")
+    return False
+
+
+def maintain_object_stores(dest_folder: str = OUTPUT_DIR):
+    """Prune, repack and garbage-collect every object store in `dest_folder`."""
+    root = os.path.join(dest_folder, ".depository")
+    stores = []
+    for parent in (root, os.path.join(root, "shared"), os.path.join(root, "submodules")):
+        if os.path.isdir(parent):
+            stores += [os.path.join(parent, d) for d in sorted(os.listdir(parent))
+                       if d.endswith(".git")]
+    if not stores:
+        print("  No object stores found.")
+        return
+    for store in stores:
+        name = os.path.relpath(store, root)
+        try:
+            before, after = gitops.maintain_store(store)
+            print(f"  [OK]    {name}  {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB")
+        except git.GitCommandError as exc:
+            print(f"  [FAIL]  {name}  {exc}")
+
+
+def extract_branch(username: str, repo_name: str, branch: str,
+                   dest_folder: str, sha: str | None = None) -> bool:
+    """
+    Stream the branch tarball straight into '{repo_name}-{branch}'
+    without keeping an archive file on disk.
+    """
+    tar_url = archive_url(username, repo_name, branch, sha, "tar.gz")
+    branch_folder = os.path.join(dest_folder, f"{repo_name}-{branch}")
+    try:
+        archive.extract_archive(tar_url, branch_folder,
+                                desc=f"  {repo_name} [{branch}]")
+        return True
+    except archive.ArchiveHTTPError as exc:
+        print(f"  [x]  Download failed for '{branch}' (HTTP {exc.status_code})")
+        return False
+    except Exception as exc:
+        print(f"  [x]  Error during extraction: {exc}")
+        return False
+
+
+def _is_sparse(profile: gitops.CloneProfile | None) -> bool:
+    """Sparse clones can't be worktrees of a shared store (see sync_worktrees)."""
+    return profile is not None and bool(profile.sparse)
+
+
 def do_download(username: str, repo_name: str, branch: str,
-                use_git: bool) -> bool:
+                method: str, sha: str | None = None,
+                profile: gitops.CloneProfile | None = None) -> bool:
+    """
+    Download one branch with `method` ("git", "zip" or "extract");
+    `profile` is the clone profile for "git".
+    """
     os.makedirs(OUTPUT_DIR, exist_ok=True)
-    if use_git:
-        return clone_branch(username, repo_name, branch, OUTPUT_DIR)
-    return download_zip(username, repo_name, branch, OUTPUT_DIR)
+    if method == "git" and SHARED_OBJECT_STORE and not _is_sparse(profile):
+        return clone_branches(username, repo_name, [(branch, sha)],
+                              OUTPUT_DIR, profile)[branch]
+    if method == "git":
+        return clone_branch(username, repo_name, branch, OUTPUT_DIR, sha=sha,
+                            profile=profile)
+    if method == "extract":
+        return extract_branch(username, repo_name, branch, OUTPUT_DIR, sha=sha)
+    return download_zip(username, repo_name, branch, OUTPUT_DIR, sha=sha)
+
+
+def do_download_branches(username: str, repo_name: str, branches: list[tuple],
+                         method: str,
+                         profile: gitops.CloneProfile | None = None) -> dict[str, bool]:
+    """
+    Download several (branch, sha) pairs of one repository. Git clones of
+    more than one branch share a single fetch (not for sparse profiles);
+    everything else goes through do_download one branch at a time.
+    Returns {branch: ok}.
+    """
+    if method == "git" and len(branches) > 1 and not _is_sparse(profile):
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        return clone_branches(username, repo_name, branches, OUTPUT_DIR, profile)
+    return {branch: do_download(username, repo_name, branch, method, sha, profile)
+            for branch, sha in branches}
+
+
+def branch_sha(branches: list, name: str) -> str | None:
+    """Head commit SHA of branch `name` from a get_branches payload."""
+    for b in branches:
+        if b["name"] == name:
+            return (b.get("commit") or {}).get("sha")
+    return None
 
 
 # ──────────────────────────────────────────────
 # Shared input helpers
 # ──────────────────────────────────────────────
 
-def prompt_download_method() -> bool:
-    """Ask the user whether to use git clone or ZIP. Returns True for git."""
+def prompt_download_method() -> str:
+    """
+    Ask the user how to download: git clone, ZIP file, or source tree
+    extracted while downloading. Returns "git", "zip" or "extract".
+    """
     while True:
-        choice = input("  Download via git clone or zip? (g/z): ").strip().lower()
+        choice = input("  Download via git clone, zip or extracted source? "
+                       "(g/z/x): ").strip().lower()
         if choice in ("g", "git"):
-            return True
+            return "git"
         if choice in ("z", "zip"):
-            return False
-        print("  Please enter 'g' or 'z'.")
+            return "zip"
+        if choice in ("x", "extract"):
+            return "extract"
+        print("  Please enter 'g', 'z' or 'x'.")
+
+
+def prompt_clone_profile() -> gitops.CloneProfile:
+    """
+    Ask how much of the repository to clone: everything, a partial clone
+    that fetches file contents (or also directories) only as needed, or
+    no files at all; then optionally which directories to check out and
+    whether to fetch submodules.
+    """
+    print("  Clone profile:")
+    print("  1.  Full")
+    print("  2.  Blobless  (only the file contents that are checked out)")
+    print("  3.  Treeless  (blobless, and directories fetched as needed too)")
+    print("  4.  No checkout  (commit only, no files written)")
+    filters = {"": "full", "1": "full", "2": "blobless", "3": "treeless", "4": None}
+    while True:
+        choice = input("  Choice (1-4, Enter for full): ").strip()
+        if choice in filters:
+            break
+        print("  Please enter 1, 2, 3 or 4.")
+    if filters[choice] is None:
+        return gitops.make_profile(checkout=False)
+    paths = input("  Only these directories (comma-separated, Enter for all): ")
+    submodules = input("  Fetch submodules too? (y/N): ").strip().lower() in ("y", "yes")
+    return gitops.make_profile(filters[choice], paths.split(","),
+                               submodules=submodules)
 
 
 def print_repo_list(repos: list, username: str = ""):
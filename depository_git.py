@@ -0,0 +1,621 @@
+"""
+depository_git.py
+Git clone and incremental sync helpers for the clone download method.
+"""
+
+from __future__ import annotations
+
+import os
+import stat
+import shutil
+import threading
+import contextlib
+from typing import NamedTuple
+
+from depository_lazy import lazy_import
+
+git = lazy_import("git")
+
+# ──────────────────────────────────────────────
+# Constants
+# ──────────────────────────────────────────────
+
+# Existing clones are updated in place (or skipped when already at the
+# wanted commit) instead of being deleted and cloned again.
+INCREMENTAL_SYNC = os.environ.get("DEPOSITORY_GIT_SYNC", "1").strip() != "0"
+
+_store_locks: dict[str, threading.Lock] = {}
+_store_locks_guard = threading.Lock()
+
+# Set by a live display to follow clone/fetch progress: called with a job
+# label, returns a git.RemoteProgress whose close() is called once git is
+# done with it.
+progress_factory = None
+
+_bytes_received = 0
+_bytes_lock = threading.Lock()
+
+# Per-run git settings (see tune()). They reach every git process through
+# GIT_CONFIG_COUNT / GIT_CONFIG_KEY_<n> / GIT_CONFIG_VALUE_<n>, which git
+# 2.31+ reads like `git -c`; older versions ignore them.
+GIT_TUNING = os.environ.get("DEPOSITORY_GIT_TUNING", "1").strip() != "0"
+GIT_SETTINGS = {
+    "protocol.version": "2",            # refs filtered server-side on fetch
+    "http.postBuffer": str(16 << 20),   # big-store negotiation fits one request
+}
+
+
+def _env_settings(name: str) -> dict[str, str]:
+    """Parse "key=value,key=value" from the environment variable `name`."""
+    pairs = (item.split("=", 1) for item in os.environ.get(name, "").split(",")
+             if "=" in item)
+    return {key.strip(): value.strip() for key, value in pairs if key.strip()}
+
+
+# Added to (or overriding) the tuned settings, e.g.
+# DEPOSITORY_GIT_CONFIG="core.compression=1,http.postBuffer=524288000".
+GIT_EXTRA_SETTINGS = _env_settings("DEPOSITORY_GIT_CONFIG")
+
+_tuning_lock = threading.Lock()
+_tuned_count = 0                  # GIT_CONFIG_* entries added by tune()
+_saved_config_count: str | None = None
+
+# Partial clone filters by name, for CloneProfile.filter.
+CLONE_FILTERS = {"full": None, "blobless": "blob:none", "treeless": "tree:0"}
+
+
+class CloneProfile(NamedTuple):
+    """
+    How much of a repository a clone fetches and writes. `filter` is a
+    partial clone filter from CLONE_FILTERS (skipped objects are fetched
+    on demand, e.g. only the files that get checked out), `sparse` the
+    directories to check out (empty: all of them), and `checkout=False`
+    fetches the commit without writing any files. `submodules` also
+    fetches the submodules of every checkout (see list_submodules).
+    """
+    filter: str | None = None
+    sparse: tuple[str, ...] = ()
+    checkout: bool = True
+    submodules: bool = False
+
+
+FULL_CLONE = CloneProfile()
+
+
+class Submodule(NamedTuple):
+    """A submodule of a checkout: its `path` there, `url` and pinned `commit`."""
+    path: str
+    url: str
+    commit: str
+
+
+# ──────────────────────────────────────────────
+# Transfer counter
+# ──────────────────────────────────────────────
+
+def count_bytes(n: int):
+    """Add to the process-wide counter of bytes git reported receiving."""
+    global _bytes_received
+    with _bytes_lock:
+        _bytes_received += n
+
+
+def bytes_received() -> int:
+    return _bytes_received
+
+
+# ──────────────────────────────────────────────
+# Internal helpers
+# ──────────────────────────────────────────────
+
+def force_remove_readonly(func, path, _):
+    """onerror handler for shutil.rmtree — strips read-only on Windows then retries."""
+    try:
+        os.chmod(path, stat.S_IWRITE)
+        func(path)
+    except Exception:
+        pass
+
+
+def _open_existing(folder: str, repo_url: str) -> git.Repo | None:
+    """Return the clone or worktree in `folder` if it tracks `repo_url`."""
+    if not os.path.exists(os.path.join(folder, ".git")):
+        return None
+    try:
+        repo = git.Repo(folder)
+        if repo.remotes.origin.url != repo_url:
+            return None
+        return repo
+    except (git.InvalidGitRepositoryError, git.NoSuchPathError, AttributeError, ValueError):
+        return None
+
+
+def _head_sha(repo: git.Repo) -> str | None:
+    try:
+        return repo.head.commit.hexsha
+    except ValueError:
+        return None
+
+
+def _remote_sha(repo: git.Repo, branch: str) -> str | None:
+    """Commit the remote branch points at, via a cheap ls-remote."""
+    out = repo.git.ls_remote("origin", f"refs/heads/{branch}")
+    return out.split()[0] if out else None
+
+
+def _sparse_paths(repo: git.Repo) -> tuple[str, ...]:
+    """Directories of an enabled sparse checkout, () for the whole tree."""
+    try:
+        if repo.git.config("--get", "core.sparseCheckout") != "true":
+            return ()
+    except git.GitCommandError:
+        return ()
+    return tuple(sorted(repo.git.sparse_checkout("list").splitlines()))
+
+
+def _has_checkout(repo: git.Repo) -> bool:
+    """False for clones and worktrees made without a checkout (no index)."""
+    return os.path.exists(os.path.join(repo.git_dir, "index"))
+
+
+def _is_current(repo: git.Repo, profile: CloneProfile) -> bool:
+    """Whether the files in an up-to-date clone or worktree match `profile`."""
+    if not profile.checkout:
+        return not _has_checkout(repo)
+    return (_has_checkout(repo) and not repo.is_dirty()
+            and _sparse_paths(repo) == tuple(sorted(profile.sparse)))
+
+
+def _clone_filter(repo: git.Repo) -> str | None:
+    try:
+        return repo.git.config("--get", "remote.origin.partialclonefilter")
+    except git.GitCommandError:
+        return None
+
+
+def _check_out(repo: git.Repo, local: str, tracking: str, profile: CloneProfile):
+    """Point branch `local` at `tracking` and write the files `profile` asks for."""
+    if not profile.checkout:
+        repo.git.update_ref(f"refs/heads/{local}", tracking)
+        repo.git.symbolic_ref("HEAD", f"refs/heads/{local}")
+        return
+    if _sparse_paths(repo) != tuple(sorted(profile.sparse)):
+        if profile.sparse:
+            repo.git.sparse_checkout("set", *profile.sparse)
+        else:
+            repo.git.sparse_checkout("disable")
+    repo.git.checkout("-f", "-B", local, tracking)
+    repo.git.clean("-fdx")
+
+
+def _progress(label: str):
+    return progress_factory(label) if progress_factory is not None else None
+
+
+def _fetch(repo: git.Repo, *args, label: str = ""):
+    """`git fetch --depth=1 *args`, reporting to progress_factory if set."""
+    progress = _progress(label)
+    if progress is None:
+        repo.git.fetch(*args, depth=1)
+        return
+    try:
+        proc = repo.git.fetch(*args, depth=1, progress=True, as_process=True,
+                              with_stdout=False, universal_newlines=True)
+        git.cmd.handle_process_output(proc, None, progress.new_message_handler(),
+                                      finalizer=None, decode_streams=False)
+        try:
+            proc.wait()
+        except git.GitCommandError as exc:
+            # The progress handler consumed stderr; hand its errors back.
+            raise git.GitCommandError(exc.command, exc.status,
+                                      "\n".join(progress.error_lines)) from None
+    finally:
+        progress.close()
+
+
+def _update_in_place(repo: git.Repo, branch: str, label: str = "",
+                     profile: CloneProfile = FULL_CLONE):
+    """Shallow-fetch `branch` and hard-reset the working tree onto it."""
+    _fetch(repo, "origin", f"+refs/heads/{branch}:refs/remotes/origin/{branch}",
+           label=label)
+    _check_out(repo, branch, f"origin/{branch}", profile)
+    repo.git.gc(auto=True)
+
+
+def _remove_folder(folder: str):
+    if os.path.exists(folder):
+        shutil.rmtree(folder, onerror=force_remove_readonly)
+
+
+def _open_store(store: str, repo_url: str | None) -> git.Repo:
+    """
+    Open (or create) a bare object store for worktrees. Stores of a single
+    repository have `repo_url` as origin; shared stores pass None.
+    """
+    try:
+        repo = git.Repo(store)
+        if repo.bare and (repo_url is None
+                          or repo.remotes.origin.url == repo_url):
+            return repo
+        repo.close()
+    except (git.InvalidGitRepositoryError, git.NoSuchPathError, AttributeError, ValueError):
+        pass
+    _remove_folder(store)
+    repo = git.Repo.init(store, bare=True, mkdir=True)
+    if repo_url is not None:
+        repo.create_remote("origin", repo_url)
+    return repo
+
+
+def _resolve_url(url: str, base: str) -> str:
+    """A .gitmodules URL, with "./" and "../" taken relative to `base`."""
+    if not url.startswith(("./", "../")):
+        return url
+    base = base.rstrip("/")
+    for part in url.split("/"):
+        if part == "..":
+            base = base.rsplit("/", 1)[0]
+        elif part not in (".", ""):
+            base += "/" + part
+    return base
+
+
+def _worktree_heads(repo: git.Repo) -> set[str]:
+    """Commits checked out by the store's worktrees (after pruning lost ones)."""
+    repo.git.worktree("prune")
+    return {line.split()[1] for line in repo.git.worktree("list", "--porcelain").splitlines()
+            if line.startswith("HEAD ")}
+
+
+def _store_lock(store: str) -> threading.Lock:
+    """Per-store lock; concurrent fetches into one store race on its shallow file."""
+    key = os.path.abspath(store)
+    with _store_locks_guard:
+        return _store_locks.setdefault(key, threading.Lock())
+
+
+def _folder_size(folder: str) -> int:
+    total = 0
+    for root, _, files in os.walk(folder):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _is_worktree_of(folder: str, store: str) -> bool:
+    """True if `folder` is a worktree whose .git file points into `store`."""
+    try:
+        with open(os.path.join(folder, ".git"), encoding="utf-8") as f:
+            gitdir = f.read().strip().removeprefix("gitdir:").strip()
+    except OSError:
+        return False
+    gitdir = os.path.abspath(os.path.join(folder, gitdir))
+    worktrees = os.path.join(os.path.abspath(store), "worktrees")
+    return os.path.dirname(gitdir) == worktrees
+
+
+# ──────────────────────────────────────────────
+# Public API
+# ──────────────────────────────────────────────
+
+def make_profile(filter_name: str = "full", sparse=(),
+                 checkout: bool = True, submodules: bool = False) -> CloneProfile:
+    """
+    CloneProfile from a CLONE_FILTERS name, sparse-checkout directories
+    and the checkout and submodules flags. Raises KeyError for an unknown
+    filter name.
+    """
+    paths = tuple(p.strip().strip("/") for p in sparse if p.strip().strip("/"))
+    return CloneProfile(CLONE_FILTERS[filter_name], paths, checkout,
+                        submodules and checkout)
+
+
+def describe_profile(profile: CloneProfile) -> str:
+    """Short description such as 'blobless, sparse: src, docs'."""
+    parts = [next(name for name, f in CLONE_FILTERS.items() if f == profile.filter)]
+    if not profile.checkout:
+        parts.append("no checkout")
+    elif profile.sparse:
+        parts.append("sparse: " + ", ".join(profile.sparse))
+    if profile.submodules:
+        parts.append("submodules")
+    return ", ".join(parts)
+
+
+def sync_branch(repo_url: str, branch: str, folder: str,
+                sha: str | None = None, label: str = "",
+                profile: CloneProfile = FULL_CLONE) -> str:
+    """
+    Make `folder` a shallow checkout of `branch` as `profile` describes.
+    Returns "unchanged" when an existing clone is already at `sha` (looked
+    up with ls-remote when not given), "updated" after an in-place fetch +
+    reset, or "cloned"; clones made with another filter or checkout mode
+    are cloned again. Raises GitCommandError if a fresh clone fails.
+    """
+    label = label or branch
+    repo = _open_existing(folder, repo_url) if INCREMENTAL_SYNC else None
+    if repo is not None and (_clone_filter(repo) != profile.filter
+                             or _has_checkout(repo) != profile.checkout
+                             or profile.sparse and repo.git_dir != repo.common_dir):
+        repo.close()
+        repo = None
+    if repo is not None:
+        try:
+            head = _head_sha(repo)
+            wanted = sha or _remote_sha(repo, branch)
+            if (head and head == wanted and repo.active_branch.name == branch
+                    and _is_current(repo, profile)):
+                print(f"  {label} is up to date.")
+                return "unchanged"
+            print(f"  Updating {label}...")
+            _update_in_place(repo, branch, label, profile)
+            return "updated"
+        except (git.GitCommandError, TypeError, ValueError):
+            # Fall through to a fresh clone.
+            pass
+        finally:
+            repo.close()
+
+    _remove_folder(folder)
+    print(f"  Cloning {label}...")
+    options = {}
+    if profile.filter:
+        options["filter"] = profile.filter
+    if profile.sparse or not profile.checkout:
+        options["no_checkout"] = True
+    progress = _progress(label)
+    try:
+        repo = git.Repo.clone_from(repo_url, folder, branch=branch, depth=1,
+                                   progress=progress, **options)
+    finally:
+        if progress is not None:
+            progress.close()
+    try:
+        if profile.checkout and profile.sparse:
+            _check_out(repo, branch, f"origin/{branch}", profile)
+    finally:
+        repo.close()
+    return "cloned"
+
+
+def sync_worktrees(repo_url: str, store: str, targets: dict[str, tuple],
+                   label: str = "", namespace: str = "origin",
+                   profile: CloneProfile = FULL_CLONE) -> dict[str, bool]:
+    """
+    Fetch several branches of one repository over a single connection
+    into the bare object store `store`, then materialise each branch as a
+    worktree as `profile` describes. `targets` maps branch -> (folder, sha
+    or None). Worktrees already at their sha are left alone.
+    Returns {branch: ok}.
+
+    A store may be shared by several repositories (e.g. a fork network);
+    each then uses its own `namespace` for remote-tracking refs and local
+    branch names so their branches never collide. Shared stores ignore
+    the profile's filter and fetch every object. Sparse profiles are not
+    supported here: git keeps sparse settings in per-worktree config,
+    which moves the store's core.bare where GitPython cannot see it;
+    clone those branches with sync_branch instead.
+    Raises GitCommandError if the shared fetch fails.
+    """
+    shared = namespace != "origin"
+    with _store_lock(store):
+        repo = _open_store(store, None if shared else repo_url)
+        try:
+            stale = {}
+            for branch, (folder, sha) in targets.items():
+                existing = (git.Repo(folder) if INCREMENTAL_SYNC and sha
+                            and _is_worktree_of(folder, store) else None)
+                if existing is not None:
+                    current = _head_sha(existing)
+                    current_files = _is_current(existing, profile)
+                    existing.close()
+                    if current == sha and current_files:
+                        print(f"  {label} [{branch}] is up to date.")
+                        continue
+                stale[branch] = (folder, sha)
+
+            results = {branch: True for branch in targets if branch not in stale}
+            if not stale:
+                return results
+
+            print(f"  Fetching {label} [{', '.join(stale)}]...")
+            refspecs = [f"+refs/heads/{b}:refs/remotes/{namespace}/{b}"
+                        for b in stale]
+            if profile.filter and not shared:
+                # Fetching from the remote rather than the URL records it
+                # as the promisor that supplies skipped objects later.
+                source = [f"--filter={profile.filter}", "origin"]
+            else:
+                source = [repo_url]
+            _fetch(repo, *source, *refspecs, label=label)
+            repo.git.worktree("prune")
+
+            for branch, (folder, _) in stale.items():
+                local = f"{namespace}/{branch}" if shared else branch
+                tracking = f"refs/remotes/{namespace}/{branch}"
+                try:
+                    worktree = (git.Repo(folder) if _is_worktree_of(folder, store)
+                                else None)
+                    if worktree is not None and _has_checkout(worktree) != profile.checkout:
+                        worktree.close()
+                        worktree = None
+                    if worktree is None:
+                        _remove_folder(folder)
+                        repo.git.worktree("prune")
+                        repo.git.worktree("add", "--no-checkout", "-f", "-B", local,
+                                          os.path.abspath(folder), tracking)
+                        worktree = git.Repo(folder)
+                    try:
+                        _check_out(worktree, local, tracking, profile)
+                    finally:
+                        worktree.close()
+                    results[branch] = True
+                except git.GitCommandError as exc:
+                    print(f"  [x]  Checkout of {label} [{branch}] failed: {exc}")
+                    results[branch] = False
+            repo.git.gc(auto=True)
+            return results
+        finally:
+            repo.close()
+
+
+def list_submodules(folder: str, repo_url: str) -> list[Submodule]:
+    """
+    Submodules of the checkout in `folder`: gitlinks in its index that
+    have a URL in .gitmodules and a directory in the checkout (sparse
+    checkouts leave the others out). Relative URLs are resolved against
+    `repo_url`. Raises GitCommandError if `folder` cannot be read.
+    """
+    if not os.path.isfile(os.path.join(folder, ".gitmodules")):
+        return []
+    repo = git.Repo(folder)
+    try:
+        try:
+            entries = repo.git.config("-f", ".gitmodules", "--get-regexp",
+                                      r"^submodule\..*\.(path|url)$").splitlines()
+        except git.GitCommandError:
+            return []                   # no path/url entries at all
+        names = {}
+        for entry in entries:
+            key, _, value = entry.partition(" ")
+            name, _, field = key.removeprefix("submodule.").rpartition(".")
+            names.setdefault(name, {})[field] = value.strip()
+        urls = {item["path"]: item["url"] for item in names.values()
+                if item.get("path") and item.get("url")}
+
+        submodules = []
+        for entry in repo.git.ls_files("-s", "-z").split("\0"):
+            meta, _, path = entry.partition("\t")
+            mode, commit = (meta.split() + ["", ""])[:2]
+            if (mode == "160000" and path in urls
+                    and os.path.isdir(os.path.join(folder, path))):
+                submodules.append(Submodule(path, _resolve_url(urls[path], repo_url),
+                                            commit))
+        return submodules
+    finally:
+        repo.close()
+
+
+def sync_submodule(url: str, commit: str, store: str, folders: list[str],
+                   label: str = "", clone_filter: str | None = None) -> str:
+    """
+    Check out `commit` of the repository at `url` as a detached worktree
+    of the bare store `store` in each of `folders`, shallow-fetching it
+    (with `clone_filter`, if given) unless a worktree of the store is
+    already at it. Folders already at `commit` are left alone.
+    Returns "unchanged", "checked out" or "fetched".
+    Raises GitCommandError if the fetch or a checkout fails.
+    """
+    label = label or commit[:7]
+    with _store_lock(store):
+        repo = _open_store(store, url)
+        try:
+            stale = []
+            for folder in folders:
+                if _is_worktree_of(folder, store):
+                    existing = git.Repo(folder)
+                    current = _head_sha(existing)
+                    existing.close()
+                    if current == commit:
+                        continue
+                stale.append(folder)
+            if not stale:
+                print(f"  {label} is up to date.")
+                return "unchanged"
+
+            # Checked-out commits are the only ones a store is known to
+            # have; asking git would make a partial clone fetch it lazily.
+            fetched = commit not in _worktree_heads(repo)
+            if fetched:
+                print(f"  Fetching {label}...")
+                source = [f"--filter={clone_filter}"] if clone_filter else []
+                _fetch(repo, *source, "origin", commit, label=label)
+            for folder in stale:
+                _remove_folder(folder)
+                repo.git.worktree("add", "--detach", "--force",
+                                  os.path.abspath(folder), commit)
+            return "fetched" if fetched else "checked out"
+        finally:
+            repo.close()
+
+
+def maintain_store(store: str) -> tuple[int, int]:
+    """
+    Drop worktrees whose folders are gone, then repack the store into a
+    single pack and delete unreachable objects.
+    Returns the store size in bytes (before, after).
+    """
+    before = _folder_size(store)
+    with _store_lock(store):
+        repo = git.Repo(store)
+        try:
+            repo.git.worktree("prune")
+            repo.git.repack("-a", "-d", "--write-bitmap-index")
+            repo.git.gc("--prune=now", "--quiet")
+        finally:
+            repo.close()
+    return before, _folder_size(store)
+
+
+# ──────────────────────────────────────────────
+# Tuning
+# ──────────────────────────────────────────────
+
+def tuned_settings(concurrent: int) -> dict[str, str]:
+    """
+    Git settings for `concurrent` clones running at once: the CPU cores
+    are split between them for parallel checkout and delta resolution
+    (index-pack), so together they do not oversubscribe the machine.
+    """
+    share = str(max(1, (os.cpu_count() or 1) // max(1, concurrent)))
+    return {**GIT_SETTINGS, "checkout.workers": share, "pack.threads": share,
+            **GIT_EXTRA_SETTINGS}
+
+
+def tune(concurrent: int | None):
+    """
+    Apply tuned_settings(concurrent) to every git command started from
+    now on; call again whenever the number of concurrent clones changes.
+    None removes the settings. Settings the user already passes through
+    GIT_CONFIG_COUNT are kept, ours come after them.
+    """
+    global _tuned_count, _saved_config_count
+    with _tuning_lock:
+        if not _tuned_count:
+            if concurrent is None or not GIT_TUNING:
+                return
+            _saved_config_count = os.environ.get("GIT_CONFIG_COUNT")
+        base = int(_saved_config_count) if (_saved_config_count or "").isdigit() else 0
+
+        if concurrent is None:
+            for index in range(base, base + _tuned_count):
+                os.environ.pop(f"GIT_CONFIG_KEY_{index}", None)
+                os.environ.pop(f"GIT_CONFIG_VALUE_{index}", None)
+            if _saved_config_count is None:
+                os.environ.pop("GIT_CONFIG_COUNT", None)
+            else:
+                os.environ["GIT_CONFIG_COUNT"] = _saved_config_count
+            _tuned_count = 0
+            return
+
+        # Same keys in the same order every time, so a retune only replaces
+        # values while other threads may be copying the environment.
+        settings = tuned_settings(concurrent)
+        for index, (key, value) in enumerate(settings.items(), base):
+            os.environ[f"GIT_CONFIG_KEY_{index}"] = key
+            os.environ[f"GIT_CONFIG_VALUE_{index}"] = value
+        _tuned_count = len(settings)
+        os.environ["GIT_CONFIG_COUNT"] = str(base + _tuned_count)
+
+
+@contextlib.contextmanager
+def tuned(concurrent: int):
+    """tune(concurrent) for the duration of a `with` block."""
+    tune(concurrent)
+    try:
+        yield
+    finally:
+        tune(None)
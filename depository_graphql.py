@@ -0,0 +1,218 @@
+"""
+depository_graphql.py
+Batched GitHub GraphQL queries for repository and branch metadata.
+
+GraphQL needs a token, so callers fall back to the REST helpers in
+depository_core when GITHUB_TOKEN_DEPOSITORY is not set. Results are
+shaped like the REST payloads ({"name": ..., "commit": {"sha": ...}})
+so the rest of the code does not care which backend produced them.
+
+A repository listing brings each repository's branches along; they are
+kept until the next get_branches_bulk call for that repository, so
+listing and selecting branches costs one query per REPOS_PER_QUERY
+repositories.
+"""
+
+import threading
+
+import depository_http as http
+from depository_lazy import lazy_import
+
+requests = lazy_import("requests")
+
+# ──────────────────────────────────────────────
+# Constants
+# ──────────────────────────────────────────────
+
+GRAPHQL_BATCH = 25        # repositories per aliased branch query
+REPOS_PER_QUERY = 50      # repositories per listing page
+REFS_PER_QUERY = 100      # branches per repository per query
+
+_REFS_FIELDS = """
+    refs(refPrefix: "refs/heads/", first: %d, after: %s,
+         orderBy: {field: ALPHABETICAL, direction: ASC}) {
+      pageInfo { hasNextPage endCursor }
+      nodes { name target { oid } }
+    }
+"""
+
+_LIST_QUERY = """
+query($owner: String!, $after: String) {
+  repositoryOwner(login: $owner) {
+    repositories(first: %d, after: $after, privacy: PUBLIC,
+                 ownerAffiliations: OWNER,
+                 orderBy: {field: NAME, direction: ASC}) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        name description diskUsage isFork
+        defaultBranchRef { name }
+        %s
+      }
+    }
+  }
+}
+""" % (REPOS_PER_QUERY, _REFS_FIELDS % (REFS_PER_QUERY, "null"))
+
+_MORE_REFS_QUERY = """
+query($owner: String!, $name: String!, $after: String) {
+  repository(owner: $owner, name: $name) {
+    %s
+  }
+}
+""" % (_REFS_FIELDS % (REFS_PER_QUERY, "$after"))
+
+# Complete branch lists from the last listing, {(owner, name): branches}.
+_listed_branches: dict[tuple[str, str], list] = {}
+_listed_lock = threading.Lock()
+
+
+# ──────────────────────────────────────────────
+# Internal helpers
+# ──────────────────────────────────────────────
+
+def _query(query: str, variables: dict) -> dict | None:
+    """
+    Run one GraphQL query. Returns the `data` object, or None on failure
+    after saying why. Rate limits (reported in a 200 response) pause the
+    shared RateLimiter and the query is retried. NOT_FOUND errors only
+    leave their field null and are not failures.
+    """
+    url = http.api_url("/graphql")
+    limiter = http.get_rate_limiter(url)
+    for attempt in range(http.RATE_LIMIT_RETRIES + 1):
+        try:
+            resp = http.request("POST", url,
+                                json={"query": query, "variables": variables},
+                                headers=http.auth_headers())
+        except requests.RequestException as exc:
+            print(f"  Network error: {exc}")
+            return None
+        if resp.status_code != 200:
+            print(f"  [!]  GraphQL query failed: HTTP {resp.status_code}")
+            return None
+        try:
+            payload = resp.json()
+        except ValueError:
+            print("  [!]  GraphQL query failed: the response is not JSON.")
+            return None
+
+        errors = payload.get("errors") or []
+        if any(error.get("type") == "RATE_LIMITED" for error in errors):
+            wait, started = limiter.pause(resp, attempt)
+            if wait > http.RATE_LIMIT_MAX_WAIT:
+                break
+            if started:
+                print(f"  [!]  GitHub rate limit reached, resuming in {wait:.0f}s...")
+            continue                    # the limiter holds the retry back
+        failures = [error for error in errors if error.get("type") != "NOT_FOUND"]
+        data = payload.get("data")
+        if failures or data is None:
+            message = (failures or errors or [{}])[0].get("message", "no data returned")
+            print(f"  [!]  GraphQL query failed: {message}")
+            return None
+        return data
+
+    print("  [!]  GraphQL rate limit still in effect, giving up.")
+    return None
+
+
+def _branch_dicts(refs: dict) -> list[dict]:
+    return [{"name": node["name"], "commit": {"sha": node["target"]["oid"]}}
+            for node in refs["nodes"]]
+
+
+def _complete_refs(owner: str, name: str, refs: dict) -> list[dict] | None:
+    """Branches from a first `refs` page, following the cursor if needed."""
+    branches = _branch_dicts(refs)
+    page_info = refs["pageInfo"]
+    while page_info["hasNextPage"]:
+        data = _query(_MORE_REFS_QUERY, {"owner": owner, "name": name,
+                                         "after": page_info["endCursor"]})
+        if not data or not data.get("repository"):
+            return None
+        refs = data["repository"]["refs"]
+        branches.extend(_branch_dicts(refs))
+        page_info = refs["pageInfo"]
+    return branches
+
+
+# ──────────────────────────────────────────────
+# Public API
+# ──────────────────────────────────────────────
+
+def get_repos(owner: str) -> list[dict] | None:
+    """
+    Return every public repository of a user/org, REPOS_PER_QUERY per
+    query, with the REST fields the callers use. Branch lists that fit
+    in the first page of refs are kept for get_branches_bulk. Returns
+    None when GraphQL is unavailable, fails, or does not know `owner`
+    (the REST listing then reports why).
+    """
+    if not http.GITHUB_TOKEN:
+        return None
+
+    repos, listed = [], {}
+    after = None
+    while True:
+        data = _query(_LIST_QUERY, {"owner": owner, "after": after})
+        if data is None or data.get("repositoryOwner") is None:
+            return None
+        page = data["repositoryOwner"]["repositories"]
+        for node in page["nodes"]:
+            repos.append({
+                "name": node["name"],
+                "full_name": f"{owner}/{node['name']}",
+                "description": node["description"],
+                "size": node["diskUsage"] or 0,
+                "fork": node["isFork"],
+                "default_branch": (node["defaultBranchRef"] or {}).get("name"),
+            })
+            if not node["refs"]["pageInfo"]["hasNextPage"]:
+                listed[(owner, node["name"])] = _branch_dicts(node["refs"])
+        if not page["pageInfo"]["hasNextPage"]:
+            break
+        after = page["pageInfo"]["endCursor"]
+
+    with _listed_lock:
+        _listed_branches.update(listed)
+    return repos
+
+
+def get_branches_bulk(owner: str, repo_names: list[str]) -> dict[str, list] | None:
+    """
+    Return {repo_name: branches} for many repositories: from the last
+    get_repos listing where it had them (each used once), otherwise
+    GRAPHQL_BATCH repositories per query. Repositories that could not be
+    resolved map to None. Returns None when GraphQL is unavailable
+    altogether.
+    """
+    if not http.GITHUB_TOKEN:
+        return None
+
+    result: dict[str, list | None] = {}
+    with _listed_lock:
+        for name in repo_names:
+            branches = _listed_branches.pop((owner, name), None)
+            if branches is not None:
+                result[name] = branches
+    repo_names = [name for name in repo_names if name not in result]
+    for start in range(0, len(repo_names), GRAPHQL_BATCH):
+        batch = repo_names[start:start + GRAPHQL_BATCH]
+        params = ", ".join(f"$n{i}: String!" for i in range(len(batch)))
+        fields = "\n".join(
+            f"r{i}: repository(owner: $owner, name: $n{i}) {{"
+            f"{_REFS_FIELDS % (REFS_PER_QUERY, 'null')}}}"
+            for i in range(len(batch))
+        )
+        query = f"query($owner: String!, {params}) {{\n{fields}\n}}"
+        variables = {"owner": owner}
+        variables.update({f"n{i}": name for i, name in enumerate(batch)})
+
+        data = _query(query, variables)
+        if data is None:
+            return None
+        for i, name in enumerate(batch):
+            repo = data.get(f"r{i}")
+            result[name] = (_complete_refs(owner, name, repo["refs"])
+                            if repo else None)
+    return result
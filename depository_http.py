@@ -0,0 +1,275 @@
+"""
+depository_http.py
+Pooled, keep-alive HTTP sessions shared by every API and archive request.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+import atexit
+import threading
+
+import depository_metrics as metrics
+from depository_lazy import lazy_import
+
+requests = lazy_import("requests")
+
+
+# ──────────────────────────────────────────────
+# Constants
+# ──────────────────────────────────────────────
+
+# Base URLs can be pointed at a local stand-in server, e.g.
+#   DEPOSITORY_API_URL=http://127.0.0.1:8080  DEPOSITORY_WEB_URL=http://127.0.0.1:8081
+API_BASE_URL = os.environ.get("DEPOSITORY_API_URL", "https://api.github.com").rstrip("/")
+WEB_BASE_URL = os.environ.get("DEPOSITORY_WEB_URL", "https://github.com").rstrip("/")
+
+REQUEST_TIMEOUT = 15   # seconds
+DEFAULT_POOL_SIZE = 4  # connections kept alive per host
+POOL_HOSTS = 4         # api.github.com, github.com, codeload.github.com, spare
+
+# API pacing, shared by every thread. GitHub's secondary limit allows
+# roughly 900 REST requests per minute; the primary quota is tracked from
+# the X-RateLimit-* headers and waited out rather than treated as fatal.
+RATE_LIMIT_PER_SECOND = 15.0  # sustained API request rate
+RATE_LIMIT_BURST = 60         # requests allowed back to back
+RATE_LIMIT_MAX_WAIT = 3600    # longest single wait (s) before giving up
+RATE_LIMIT_RETRIES = 5        # rate-limited attempts per request
+SECONDARY_BACKOFF = 60        # first wait (s) for a secondary limit without Retry-After
+
+# Optional GitHub personal access token.
+# Get one at: https://github.com/settings/tokens  (no scopes needed for public repos)
+GITHUB_TOKEN = os.environ.get("GITHUB_TOKEN_DEPOSITORY", "").strip()
+
+_session: requests.Session | None = None
+_pool_size = DEFAULT_POOL_SIZE
+_lock = threading.Lock()
+
+
+# ──────────────────────────────────────────────
+# URL helpers
+# ──────────────────────────────────────────────
+
+def api_url(path: str) -> str:
+    """Absolute URL for a REST API path such as '/users/x/repos'."""
+    return f"{API_BASE_URL}/{path.lstrip('/')}"
+
+
+def web_url(path: str) -> str:
+    """Absolute URL for a github.com path (archives, clone URLs)."""
+    return f"{WEB_BASE_URL}/{path.lstrip('/')}"
+
+
+def auth_headers() -> dict:
+    if GITHUB_TOKEN:
+        return {"Authorization": f"Bearer {GITHUB_TOKEN}"}
+    return {}
+
+
+# ──────────────────────────────────────────────
+# Session management
+# ──────────────────────────────────────────────
+
+def _mount_adapters(session: requests.Session):
+    adapter = requests.adapters.HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=_pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+
+def _new_session() -> requests.Session:
+    session = requests.Session()
+    session.headers.update({
+        "User-Agent": "Depository",
+        "Accept-Encoding": "gzip, deflate",
+        "Connection": "keep-alive",
+    })
+    _mount_adapters(session)
+    return session
+
+
+def get_session() -> requests.Session:
+    """Return the process-wide session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = _new_session()
+    return _session
+
+
+def configure_pool(workers: int):
+    """
+    Size the per-host connection pools for `workers` concurrent users.
+    Call before starting the workers; pools only ever grow.
+    """
+    global _pool_size
+    with _lock:
+        if workers <= _pool_size:
+            return
+        _pool_size = workers
+        if _session is not None:
+            for adapter in _session.adapters.values():
+                adapter.close()
+            _mount_adapters(_session)
+
+
+def close_sessions():
+    """Drop all pooled connections."""
+    global _session
+    with _lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+atexit.register(close_sessions)
+
+
+# ──────────────────────────────────────────────
+# Rate limiting
+# ──────────────────────────────────────────────
+
+class RateLimiter:
+    """
+    Token bucket shared by all threads talking to one API resource, plus
+    the last quota GitHub reported. acquire() blocks while the bucket is
+    empty, the quota is used up, or a Retry-After pause is in effect.
+    """
+
+    def __init__(self, rate: float = RATE_LIMIT_PER_SECOND,
+                 burst: int = RATE_LIMIT_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.remaining: int | None = None
+        self.reset_at = 0.0
+        self.pause_until = 0.0
+        self._refilled = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst,
+                                  self.tokens + (now - self._refilled) * self.rate)
+                self._refilled = now
+
+                wait = self.pause_until - time.time()
+                if self.remaining is not None and self.remaining <= 0:
+                    wait = max(wait, self.reset_at - time.time())
+                if wait <= 0 and self.tokens >= 1:
+                    self.tokens -= 1
+                    if self.remaining is not None:
+                        self.remaining -= 1
+                    return
+                if wait <= 0:
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(min(wait, 5))
+
+    def update(self, resp: requests.Response):
+        """Record the quota headers of a response."""
+        remaining = resp.headers.get("X-RateLimit-Remaining")
+        reset = resp.headers.get("X-RateLimit-Reset")
+        with self._lock:
+            if remaining is not None and remaining.isdigit():
+                self.remaining = int(remaining)
+            if reset is not None and reset.isdigit():
+                self.reset_at = float(reset)
+
+    def backoff(self, resp: requests.Response, attempt: int) -> tuple[float, bool] | None:
+        """
+        If `resp` was rate limited, pause every thread and return
+        (seconds to wait, whether this call started the pause).
+        Returns None for any other response.
+        """
+        if resp.status_code not in (403, 429):
+            return None
+        if not (resp.headers.get("Retry-After", "").isdigit()
+                or resp.headers.get("X-RateLimit-Remaining") == "0"
+                or "rate limit" in resp.text.lower()):
+            return None
+        return self.pause(resp, attempt)
+
+    def pause(self, resp: requests.Response, attempt: int) -> tuple[float, bool]:
+        """
+        Pause every thread after `resp` was rate limited (also for limits
+        reported in the body, as GraphQL does). Returns (seconds to wait,
+        whether this call started the pause).
+        """
+        now = time.time()
+        retry_after = resp.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            until = now + int(retry_after)
+        elif resp.headers.get("X-RateLimit-Remaining") == "0":
+            until = max(self.reset_at, now) + 1
+        else:
+            until = now + SECONDARY_BACKOFF * 2 ** attempt
+
+        with self._lock:
+            started = until > self.pause_until + 1
+            self.pause_until = max(self.pause_until, until)
+        return until - now, started
+
+
+_limiters = {"core": RateLimiter(), "graphql": RateLimiter()}
+
+
+def _resource(url: str) -> str:
+    """API resource ("core" / "graphql") of a URL, or "web" for the rest."""
+    if not url.startswith(API_BASE_URL):
+        return "web"
+    return "graphql" if url[len(API_BASE_URL):].startswith("/graphql") else "core"
+
+
+def get_rate_limiter(url: str) -> RateLimiter | None:
+    """The limiter for an API URL, or None for non-API traffic."""
+    return _limiters.get(_resource(url))
+
+
+# ──────────────────────────────────────────────
+# Requests
+# ──────────────────────────────────────────────
+
+def _send(method: str, url: str, **kwargs) -> requests.Response:
+    """One request through the session, recorded in the run metrics."""
+    started = time.monotonic()
+    resp = get_session().request(method, url, **kwargs)
+    metrics.record_request(_resource(url), method, url, resp.status_code,
+                           time.monotonic() - started,
+                           resp.headers.get("X-RateLimit-Remaining"),
+                           resp.headers.get("X-RateLimit-Reset"))
+    return resp
+
+
+def request(method: str, url: str, **kwargs) -> requests.Response:
+    """
+    Issue a request through the shared session. API requests are paced by
+    the shared rate limiter and retried after waiting out rate limits.
+    """
+    kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+    limiter = get_rate_limiter(url)
+    if limiter is None:
+        return _send(method, url, **kwargs)
+
+    attempt = 0
+    while True:
+        limiter.acquire()
+        resp = _send(method, url, **kwargs)
+        limiter.update(resp)
+        pause = limiter.backoff(resp, attempt)
+        if pause is None:
+            return resp
+        wait, started = pause
+        if attempt >= RATE_LIMIT_RETRIES or wait > RATE_LIMIT_MAX_WAIT:
+            return resp
+        if started:
+            print(f"  [!]  GitHub rate limit reached, resuming in {wait:.0f}s...")
+        resp.close()
+        metrics.note_retry()
+        attempt += 1
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
@@ -0,0 +1,40 @@
+"""
+depository_lazy.py
+Deferred imports for the heavy third-party packages (requests, GitPython,
+tqdm, aiohttp), so starting the tool does not wait for them.
+
+    requests = lazy_import("requests")
+
+binds a placeholder module; the real import happens on the first
+attribute access (requests.get, requests.RequestException, ...). Modules
+that annotate with these packages use `from __future__ import
+annotations` so annotations do not count as a use.
+"""
+
+import importlib
+import importlib.util
+import types
+
+
+class _LazyModule(types.ModuleType):
+    """Placeholder that imports the real module on first attribute access."""
+
+    def __getattr__(self, attr: str):
+        # Only called for names not yet copied over. import_module holds
+        # the per-module import lock, so concurrent first uses are safe.
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """A module object for `name` that is imported when first used."""
+    return _LazyModule(name)
+
+
+def installed(name: str) -> bool:
+    """Whether `name` can be imported, without importing it."""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
@@ -0,0 +1,327 @@
+"""
+depository_metrics.py
+Run metrics: every HTTP request, every download job and the API quota
+used, written at the end of a run as a JSON report and, optionally, a
+Prometheus textfile (for node_exporter's textfile collector).
+
+Reports go to DEPOSITORY_REPORT_DIR (default: the cache folder's
+'reports'); DEPOSITORY_PROMETHEUS_FILE names the textfile to write.
+"""
+
+import os
+import json
+import time
+import threading
+import contextlib
+from datetime import datetime, timezone
+
+import depository_cache as cache
+
+# ──────────────────────────────────────────────
+# Constants
+# ──────────────────────────────────────────────
+
+REPORT_DIR = (os.environ.get("DEPOSITORY_REPORT_DIR", "").strip()
+              or os.path.join(cache.CACHE_DIR, "reports"))
+REPORTS_KEPT = 50          # older reports in REPORT_DIR are deleted
+REQUESTS_KEPT = 5000       # individual requests listed in a report
+PROMETHEUS_FILE = os.environ.get("DEPOSITORY_PROMETHEUS_FILE", "").strip()
+
+_lock = threading.Lock()
+_local = threading.local()
+
+
+class Job:
+    """Metrics of one download task (one repository, one or more branches)."""
+
+    def __init__(self, username: str, repo_name: str, branches: list[str],
+                 method: str):
+        self.username = username
+        self.repo_name = repo_name
+        self.branches = branches
+        self.method = method
+        self.ok: bool | None = None
+        self.bytes = 0
+        self.retries = 0
+        self.started = time.monotonic()
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add_bytes(self, n: int):
+        with self._lock:
+            self.bytes += n
+
+    def add_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def finish(self, ok: bool):
+        self.ok = ok
+        self.seconds = time.monotonic() - self.started
+
+    def as_dict(self, run_started: float) -> dict:
+        return {
+            "owner": self.username,
+            "repo": self.repo_name,
+            "branches": self.branches,
+            "method": self.method,
+            "ok": self.ok,
+            "start_offset_s": round(self.started - run_started, 3),
+            "duration_s": round(self.seconds, 3),
+            "bytes": self.bytes,
+            "throughput_bps": round(self.bytes / self.seconds) if self.seconds else 0,
+            "retries": self.retries,
+        }
+
+
+def _new_run() -> dict:
+    return {
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "started": time.monotonic(),
+        "requests": [],
+        "latencies": {},   # kind -> [seconds]
+        "statuses": {},    # (kind, status) -> count
+        "quota": {},       # resource -> {"first": (remaining, reset), "last": ...}
+        "jobs": [],
+    }
+
+
+_run = _new_run()
+
+
+# ──────────────────────────────────────────────
+# Recording
+# ──────────────────────────────────────────────
+
+def start_run():
+    """Forget everything recorded so far; the next report starts here."""
+    global _run
+    with _lock:
+        _run = _new_run()
+
+
+def record_request(kind: str, method: str, url: str, status: int,
+                   seconds: float, remaining: str | None = None,
+                   reset: str | None = None):
+    """
+    Record one HTTP request. `kind` is the API resource ("core",
+    "graphql") or "web" for archive and page downloads; for API requests
+    pass the X-RateLimit-Remaining / -Reset headers.
+    """
+    with _lock:
+        if len(_run["requests"]) < REQUESTS_KEPT:
+            _run["requests"].append({"kind": kind, "method": method, "url": url,
+                                     "status": status,
+                                     "latency_ms": round(seconds * 1000, 1)})
+        _run["latencies"].setdefault(kind, []).append(seconds)
+        key = (kind, status)
+        _run["statuses"][key] = _run["statuses"].get(key, 0) + 1
+        if remaining is not None and remaining.isdigit():
+            point = (int(remaining), reset)
+            quota = _run["quota"].setdefault(kind, {"first": point})
+            quota["last"] = point
+
+
+@contextlib.contextmanager
+def job(username: str, repo_name: str, branches: list[str], method: str):
+    """Time a download task and attribute bytes/retries in this thread to it."""
+    current = Job(username, repo_name, branches, method)
+    try:
+        with bind(current):
+            yield current
+    finally:
+        if current.ok is None:
+            current.finish(False)
+        with _lock:
+            _run["jobs"].append(current)
+
+
+def start_job(username: str, repo_name: str, branches: list[str],
+              method: str) -> Job:
+    """A Job for callers that cannot use the job() context (e.g. asyncio)."""
+    current = Job(username, repo_name, branches, method)
+    with _lock:
+        _run["jobs"].append(current)
+    return current
+
+
+@contextlib.contextmanager
+def bind(current: Job | None):
+    """Attribute bytes and retries recorded in this thread to `current`."""
+    previous = getattr(_local, "job", None)
+    _local.job = current
+    try:
+        yield current
+    finally:
+        _local.job = previous
+
+
+def current_job() -> Job | None:
+    return getattr(_local, "job", None)
+
+
+def add_bytes(n: int):
+    current = current_job()
+    if current is not None:
+        current.add_bytes(n)
+
+
+def note_retry():
+    current = current_job()
+    if current is not None:
+        current.add_retry()
+
+
+# ──────────────────────────────────────────────
+# Reports
+# ──────────────────────────────────────────────
+
+def _percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _quota_used(kind: str, quota: dict) -> int:
+    (first, first_reset), (last, last_reset) = quota["first"], quota["last"]
+    if first_reset == last_reset:
+        return first - last + 1
+    # The quota window rolled over: count the requests that were charged.
+    return sum(count for (k, status), count in _run["statuses"].items()
+               if k == kind and status != 304)
+
+
+def report(notes: list[str] | None = None) -> dict:
+    """The current run as a JSON-serialisable dict."""
+    with _lock:
+        started = _run["started"]
+        jobs = [j.as_dict(started) for j in _run["jobs"] if j.ok is not None]
+        requests = {}
+        for kind, latencies in _run["latencies"].items():
+            requests[kind] = {
+                "count": len(latencies),
+                "by_status": {str(status): count for (k, status), count
+                              in sorted(_run["statuses"].items()) if k == kind},
+                "latency_ms": {
+                    "p50": round(_percentile(latencies, 0.50) * 1000, 1),
+                    "p95": round(_percentile(latencies, 0.95) * 1000, 1),
+                    "max": round(max(latencies) * 1000, 1),
+                },
+            }
+        quota = {kind: {"remaining": q["last"][0], "used": _quota_used(kind, q)}
+                 for kind, q in _run["quota"].items()}
+        log = list(_run["requests"])
+
+    total_bytes = sum(j["bytes"] for j in jobs)
+    duration = time.monotonic() - started
+    return {
+        "started_at": _run["started_at"],
+        "duration_s": round(duration, 3),
+        "jobs_ok": sum(1 for j in jobs if j["ok"]),
+        "jobs_failed": sum(1 for j in jobs if not j["ok"]),
+        "bytes": total_bytes,
+        "throughput_bps": round(total_bytes / duration) if duration else 0,
+        "api_quota": quota,
+        "requests": requests,
+        "notes": notes or [],
+        "jobs": jobs,
+        "request_log": log,
+    }
+
+
+def _prometheus_text(data: dict) -> str:
+    lines = [
+        "# HELP depository_run_duration_seconds Wall-clock time of the last run.",
+        "# TYPE depository_run_duration_seconds gauge",
+        f"depository_run_duration_seconds {data['duration_s']}",
+        "# HELP depository_run_timestamp_seconds When the last run finished.",
+        "# TYPE depository_run_timestamp_seconds gauge",
+        f"depository_run_timestamp_seconds {time.time():.0f}",
+        "# HELP depository_jobs Download tasks of the last run.",
+        "# TYPE depository_jobs gauge",
+    ]
+    counts, sizes, seconds = {}, {}, {}
+    for j in data["jobs"]:
+        key = (j["method"], "ok" if j["ok"] else "failed")
+        counts[key] = counts.get(key, 0) + 1
+        sizes[j["method"]] = sizes.get(j["method"], 0) + j["bytes"]
+        seconds[j["method"]] = seconds.get(j["method"], 0) + j["duration_s"]
+    for (method, status), count in sorted(counts.items()):
+        lines.append(f'depository_jobs{{method="{method}",status="{status}"}} {count}')
+    lines += ["# HELP depository_bytes Bytes downloaded in the last run.",
+              "# TYPE depository_bytes gauge"]
+    lines += [f'depository_bytes{{method="{m}"}} {n}' for m, n in sorted(sizes.items())]
+    lines += ["# HELP depository_job_seconds Summed task time in the last run.",
+              "# TYPE depository_job_seconds gauge"]
+    lines += [f'depository_job_seconds{{method="{m}"}} {s:.3f}'
+              for m, s in sorted(seconds.items())]
+    lines += ["# HELP depository_http_requests HTTP requests of the last run.",
+              "# TYPE depository_http_requests gauge"]
+    for kind, stats in sorted(data["requests"].items()):
+        for status, count in stats["by_status"].items():
+            lines.append(f'depository_http_requests{{kind="{kind}",status="{status}"}} {count}')
+    lines += ["# HELP depository_http_latency_seconds HTTP latency quantiles of the last run.",
+              "# TYPE depository_http_latency_seconds gauge"]
+    for kind, stats in sorted(data["requests"].items()):
+        for quantile in ("p50", "p95"):
+            value = stats["latency_ms"][quantile] / 1000
+            lines.append(f'depository_http_latency_seconds{{kind="{kind}",'
+                         f'quantile="0.{quantile[1:]}"}} {value}')
+    lines += ["# HELP depository_api_quota_used API quota used by the last run.",
+              "# TYPE depository_api_quota_used gauge"]
+    lines += [f'depository_api_quota_used{{resource="{k}"}} {q["used"]}'
+              for k, q in sorted(data["api_quota"].items())]
+    lines += ["# HELP depository_api_quota_remaining API quota left after the last run.",
+              "# TYPE depository_api_quota_remaining gauge"]
+    lines += [f'depository_api_quota_remaining{{resource="{k}"}} {q["remaining"]}'
+              for k, q in sorted(data["api_quota"].items())]
+    return "\n".join(lines) + "\n"
+
+
+def _write_atomic(path: str, content: str):
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+def _prune_reports():
+    try:
+        names = sorted(n for n in os.listdir(REPORT_DIR)
+                       if n.startswith("run-") and n.endswith(".json"))
+    except OSError:
+        return
+    for name in names[:max(0, len(names) - REPORTS_KEPT)]:
+        try:
+            os.remove(os.path.join(REPORT_DIR, name))
+        except OSError:
+            pass
+
+
+def write_report(notes: list[str] | None = None, path: str | None = None,
+                 prometheus: str | None = None) -> str | None:
+    """
+    Write the run report (to `path`, or a timestamped file in REPORT_DIR)
+    and the Prometheus textfile (`prometheus`, or PROMETHEUS_FILE if set).
+    Returns the report path, or None if it could not be written.
+    """
+    data = report(notes)
+    if path is None:
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(REPORT_DIR, f"run-{stamp}.json")
+    try:
+        _write_atomic(path, json.dumps(data, indent=2))
+    except OSError as exc:
+        print(f"  [x]  Could not write run report: {exc}")
+        path = None
+    else:
+        _prune_reports()
+
+    prometheus = prometheus or PROMETHEUS_FILE
+    if prometheus:
+        try:
+            _write_atomic(prometheus, _prometheus_text(data))
+        except OSError as exc:
+            print(f"  [x]  Could not write Prometheus textfile: {exc}")
+    return path
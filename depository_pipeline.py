@@ -0,0 +1,107 @@
+"""
+depository_pipeline.py
+Streaming "mirror everything" runs: repository pages feed branch
+resolution, which feeds the download lanes.
+
+Nothing waits for the full listing. As soon as the first page of
+repositories arrives their default branches are resolved, and each
+resolved branch is handed to the scheduler straight away, so the first
+download starts after one API page instead of after all metadata.
+"""
+
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import depository_core as core
+import depository_scheduler as scheduler
+
+# ──────────────────────────────────────────────
+# Constants
+# ──────────────────────────────────────────────
+
+RESOLVE_WORKERS = 8  # concurrent default-branch lookups
+
+_DONE = object()
+
+
+# ──────────────────────────────────────────────
+# Stages
+# ──────────────────────────────────────────────
+
+def stream_default_branches(username: str, method: str,
+                            sizes: dict | None = None, repo_filter=None,
+                            profile=None, failures: dict | None = None):
+    """
+    Yield (username, repo_name, [(branch, sha)], method, profile) download
+    tasks for the default branch of every public repository of `username`, as
+    they are discovered. `repo_filter`, if given, is called with each repo
+    payload and skips the repository when it returns False. Repository
+    sizes are recorded in `sizes` for the scheduler as they arrive.
+    Repositories that could not be resolved, and a listing that failed
+    (as (username, core.LISTING)), are recorded as False in `failures`.
+    """
+    tasks = queue.Queue()
+    failures = failures if failures is not None else {}
+
+    def resolve(repo: dict):
+        name = repo["name"]
+        branch = repo.get("default_branch")
+        try:
+            info = core.get_branch(username, name, branch) if branch else None
+        except Exception as exc:
+            print(f"  [x]  {name} [{branch}] — exception: {exc}")
+            failures[(name, branch or "default")] = False
+            return
+        if info is None:
+            print(f"  [!]  {name}: no default branch (empty repository?). Skipping.")
+            return
+        sha = (info.get("commit") or {}).get("sha")
+        tasks.put((username, name, [(branch, sha)], method, profile))
+
+    def produce():
+        try:
+            with ThreadPoolExecutor(max_workers=RESOLVE_WORKERS,
+                                    thread_name_prefix="resolve") as pool:
+                for page in core.iter_repos(username):
+                    if page is None:
+                        failures[(username, core.LISTING)] = False
+                        break
+                    for repo in page:
+                        if repo_filter is not None and not repo_filter(repo):
+                            continue
+                        if sizes is not None:
+                            sizes[repo["name"]] = repo.get("size", 0)
+                        pool.submit(resolve, repo)
+        except Exception as exc:
+            print(f"  [x]  Listing repositories of {username} failed: {exc}")
+            failures[(username, core.LISTING)] = False
+        finally:
+            tasks.put(_DONE)
+
+    threading.Thread(target=produce, name="repo-pages", daemon=True).start()
+    while (task := tasks.get()) is not _DONE:
+        yield task
+
+
+# ──────────────────────────────────────────────
+# Public API
+# ──────────────────────────────────────────────
+
+def mirror_default_branches(username: str, method: str,
+                            notes: list[str] | None = None,
+                            repo_filter=None, profile=None) -> dict[tuple, bool]:
+    """
+    Download the default branch of every public repository of `username`
+    with `method` (and clone `profile`, for git), overlapping listing,
+    branch resolution and downloads. Returns {(repo_name, branch): ok};
+    a listing that failed, even partway, adds {(username, core.LISTING): False}.
+    """
+    sizes = {}
+    failures = {}
+    results = scheduler.run_stream(
+        stream_default_branches(username, method, sizes, repo_filter, profile,
+                                failures),
+        sizes, notes)
+    results.update(failures)
+    return results
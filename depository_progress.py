@@ -0,0 +1,243 @@
+"""
+depository_progress.py
+One live status line for a whole download run, in place of a progress
+bar per archive.
+
+Shows the combined transfer rate (archives plus git clones), active and
+limit per lane, queued / completed / failed jobs, an ETA and what each
+running clone is doing, e.g.
+
+    Downloads 41/120 |███▍      | 38.2 MB/s · ZIP 12/16 · Git 2/2 · queued 65 · failed 1 · ETA 1m 10s · linux [master] receiving 43%
+
+The line is redrawn at most every REFRESH_INTERVAL seconds (LOG_INTERVAL
+when output is not a terminal); messages printed meanwhile scroll above
+it.
+"""
+
+import re
+import sys
+import time
+import threading
+import contextlib
+
+from git import RemoteProgress
+from tqdm import tqdm
+
+import depository_archive as archive
+import depository_git as gitops
+import depository_metrics as metrics
+
+# ──────────────────────────────────────────────
+# Constants
+# ──────────────────────────────────────────────
+
+REFRESH_INTERVAL = 0.5   # seconds between redraws
+LOG_INTERVAL = 30.0      # ...when output goes to a file or pipe instead of a terminal
+RATE_SMOOTHING = 0.3     # weight of the newest sample in the shown rate
+CLONES_SHOWN = 3         # running clones listed on the line
+
+_SIZE_UNITS = {"bytes": 1, "KiB": 1024, "MiB": 1024 ** 2, "GiB": 1024 ** 3}
+_SIZE_RE = re.compile(r"([\d.]+) (bytes|KiB|MiB|GiB)")
+
+_STAGES = {
+    RemoteProgress.COUNTING: "counting",
+    RemoteProgress.COMPRESSING: "compressing",
+    RemoteProgress.RECEIVING: "receiving",
+    RemoteProgress.RESOLVING: "resolving",
+    RemoteProgress.CHECKING_OUT: "checking out",
+}
+
+
+# ──────────────────────────────────────────────
+# Internal helpers
+# ──────────────────────────────────────────────
+
+def _format_rate(rate: float) -> str:
+    for unit in ("B/s", "KB/s", "MB/s"):
+        if rate < 1024:
+            return f"{rate:.1f} {unit}"
+        rate /= 1024
+    return f"{rate:.1f} GB/s"
+
+
+def _format_eta(seconds: float) -> str:
+    seconds = round(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+
+
+class _CloneProgress(RemoteProgress):
+    """Tracks the stage, percentage and bytes received of one git command."""
+
+    def __init__(self, board: "Dashboard", label: str):
+        super().__init__()
+        self.board = board
+        self.label = label
+        self.stage = "starting"
+        self.percent = None
+        self.received = 0
+        self.job = metrics.current_job()  # git reports from its own threads
+
+    def update(self, op_code, cur_count, max_count=None, message=""):
+        stage = _STAGES.get(op_code & RemoteProgress.OP_MASK)
+        if stage:
+            self.stage = stage
+            self.percent = (100 * cur_count / max_count) if max_count else None
+        match = _SIZE_RE.search(message or "")
+        if stage == "receiving" and match:
+            received = int(float(match.group(1)) * _SIZE_UNITS[match.group(2)])
+            delta = max(0, received - self.received)
+            gitops.count_bytes(delta)
+            if self.job is not None:
+                self.job.add_bytes(delta)
+            self.received = max(self.received, received)
+
+    def close(self):
+        with self.board.lock:
+            self.board.clones.pop(id(self), None)
+
+    def describe(self) -> str:
+        if self.percent is None:
+            return f"{self.label} {self.stage}"
+        return f"{self.label} {self.stage} {self.percent:.0f}%"
+
+
+class _LineWriter:
+    """stdout replacement that prints complete lines above the status line."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.pending = ""
+
+    def write(self, text: str) -> int:
+        self.pending += text
+        *lines, self.pending = self.pending.split("\n")
+        for line in lines:
+            tqdm.write(line, file=self.stream)
+        return len(text)
+
+    def flush(self):
+        if self.pending:
+            tqdm.write(self.pending, file=self.stream)
+            self.pending = ""
+        self.stream.flush()
+
+
+# ──────────────────────────────────────────────
+# Public API
+# ──────────────────────────────────────────────
+
+class Dashboard:
+    """
+    Live status line for a run. Use as a context manager around the run;
+    `lanes` maps lane names to objects with `active`, `limit` and
+    `queued` attributes (see depository_scheduler.Lane).
+    """
+
+    def __init__(self, lanes: dict, titles: dict[str, str], total: int = 0):
+        self.lanes = lanes
+        self.titles = titles
+        self.total = total
+        self.completed = 0
+        self.failed = 0
+        self.clones: dict[int, _CloneProgress] = {}
+        self.lock = threading.Lock()
+        self._rate = 0.0
+        self._stop = threading.Event()
+        self._interval = REFRESH_INTERVAL
+        self._bar = None
+        self._redirect = None
+
+    # ── git progress hook ──────────────────────────────────
+    def _clone_progress(self, label: str) -> _CloneProgress:
+        progress = _CloneProgress(self, label)
+        with self.lock:
+            self.clones[id(progress)] = progress
+        return progress
+
+    # ── counters ───────────────────────────────────────────
+    def add_jobs(self, count: int = 1):
+        with self.lock:
+            self.total += count
+
+    def job_done(self, ok: bool):
+        with self.lock:
+            self.completed += 1
+            if not ok:
+                self.failed += 1
+
+    # ── rendering ──────────────────────────────────────────
+    def _status(self, elapsed: float | None) -> str:
+        with self.lock:
+            completed, total, failed = self.completed, self.total, self.failed
+            clones = [clone.describe() for clone in self.clones.values()]
+        parts = [_format_rate(self._rate)]
+        queued = 0
+        for name, lane in self.lanes.items():
+            parts.append(f"{self.titles[name]} {lane.active}/{lane.limit}")
+            queued += lane.queued
+        parts.append(f"queued {queued}")
+        if failed:
+            parts.append(f"failed {failed}")
+        if elapsed is not None and completed and total > completed:
+            parts.append(f"ETA {_format_eta(elapsed / completed * (total - completed))}")
+        parts.extend(clones[:CLONES_SHOWN])
+        if len(clones) > CLONES_SHOWN:
+            parts.append(f"+{len(clones) - CLONES_SHOWN} more")
+        return " · ".join(parts)
+
+    def _render(self, status: str):
+        with self.lock:
+            completed, total = self.completed, self.total
+        if self._bar is None:
+            print(f"  Downloads {completed}/{total} · {status}", flush=True)
+            return
+        self._bar.total = total
+        self._bar.n = completed
+        self._bar.set_description_str(status, refresh=False)
+        self._bar.refresh()
+
+    def _refresh_loop(self):
+        started = last_time = time.monotonic()
+        last_bytes = archive.bytes_downloaded() + gitops.bytes_received()
+        while not self._stop.wait(self._interval):
+            now = time.monotonic()
+            transferred = archive.bytes_downloaded() + gitops.bytes_received()
+            sample = (transferred - last_bytes) / (now - last_time)
+            self._rate += RATE_SMOOTHING * (sample - self._rate)
+            last_time, last_bytes = now, transferred
+            self._render(self._status(now - started))
+
+    def __enter__(self):
+        stream = sys.stdout
+        if stream.isatty():
+            self._bar = tqdm(total=self.total, unit="job", file=stream,
+                             dynamic_ncols=True, mininterval=self._interval,
+                             bar_format="  Downloads {n_fmt}/{total_fmt} |{bar:10}| {desc}")
+            self._redirect = contextlib.redirect_stdout(_LineWriter(stream))
+            self._redirect.__enter__()
+        else:
+            # Logs get a plain status line now and then instead of a bar.
+            self._interval = LOG_INTERVAL
+        archive.progress_bars = False
+        gitops.progress_factory = self._clone_progress
+        self._thread = threading.Thread(target=self._refresh_loop,
+                                        name="dashboard", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        gitops.progress_factory = None
+        archive.progress_bars = True
+        if self._redirect is not None:
+            sys.stdout.flush()
+            self._redirect.__exit__(*exc)
+        self._render(self._status(None))
+        if self._bar is not None:
+            self._bar.close()
+        return False
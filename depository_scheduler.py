@@ -0,0 +1,526 @@
+"""
+depository_scheduler.py
+Adaptive, lane-based concurrency for MDepository's download runs.
+
+Git clones (checkout-heavy, bound by CPU and disk) and ZIP/extract jobs
+(network-bound) run in separate lanes with independent worker limits.
+While a run is in progress each lane's limit is tuned by hill climbing:
+it keeps growing while throughput improves, backs off when throughput
+drops, and settles at the knee of the curve. Both lanes are measured in
+bytes received: archive bytes for the ZIP lane, the bytes git reports in
+its clone/fetch progress for the git lane.
+
+Jobs are started longest first (LPT), using each repository's `size`
+from the API and how long it took last time, so one huge repository
+queued late cannot leave a single worker running long after the rest.
+
+Clones with a submodules profile queue their submodules as further jobs
+in the git lane (SubmoduleJobs) instead of fetching them one by one.
+
+DEPOSITORY_ZIP_WORKERS / DEPOSITORY_GIT_WORKERS pin a lane to a fixed
+number of workers and turn tuning off for it. Whenever the git lane's
+limit moves, git's own thread counts are retuned (depository_git.tune)
+so the clones together use about one thread per core.
+"""
+
+import os
+import time
+import heapq
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import depository_archive as archive
+import depository_cache as cache
+import depository_core as core
+import depository_git as gitops
+import depository_metrics as metrics
+from depository_lazy import lazy_import
+
+# Imports GitPython and tqdm, so it is loaded by the first run, not at startup.
+progress = lazy_import("depository_progress")
+
+# ──────────────────────────────────────────────
+# Constants
+# ──────────────────────────────────────────────
+
+ADAPT_INTERVAL = 3.0    # seconds between tuning steps
+ADAPT_TOLERANCE = 0.10  # relative change treated as noise
+ADAPT_HOLD = 3          # intervals to hold after settling before probing again
+
+ZIP_WORKERS = (4, 2, 32)  # initial, min, max
+GIT_WORKERS = (2, 1, max(2, (os.cpu_count() or 2) // 2))
+
+LANE_TITLES = {"zip": "ZIP", "git": "Git"}
+
+# Duration estimates for repositories without a recorded timing.
+JOB_OVERHEAD = 1.5           # seconds of request/setup cost per branch
+DEFAULT_RATES = {            # bytes/s of repository `size` per worker
+    "zip": 4 * 1024 * 1024,
+    "extract": 3 * 1024 * 1024,
+    "git": 2 * 1024 * 1024,
+}
+RATE_SMOOTHING = 0.3         # weight of a new observation in the learned rates
+MIN_RATE_SAMPLE = 1.0        # shorter jobs say too little about throughput
+
+
+def _env_workers(name: str) -> int | None:
+    value = os.environ.get(name, "").strip()
+    return int(value) if value.isdigit() and int(value) > 0 else None
+
+
+# ──────────────────────────────────────────────
+# Lanes
+# ──────────────────────────────────────────────
+
+class Lane:
+    """
+    A pool of threads of which at most `limit` run jobs at once. The pool
+    is sized for `maximum`; the extra threads wait at a gate, so the limit
+    can move in either direction without restarting anything.
+    """
+
+    def __init__(self, name: str, initial: int, minimum: int, maximum: int,
+                 fixed: int | None = None):
+        self.name = name
+        self.minimum = fixed or minimum
+        self.maximum = fixed or maximum
+        self.limit = fixed or max(minimum, min(initial, maximum))
+        self.fixed = fixed is not None
+        self.peak = self.limit
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=self.maximum,
+                                            thread_name_prefix=f"{name}-lane")
+        # Tuner state
+        self._last_count = 0
+        self._last_rate: float | None = None
+        self._direction = 1
+        self._hold = 0
+
+    def submit(self, fn, *args):
+        with self._cond:
+            self.queued += 1
+        return self._executor.submit(self._run, fn, args)
+
+    def _run(self, fn, args):
+        with self._cond:
+            while self.active >= self.limit:
+                self._cond.wait()
+            self.queued -= 1
+            self.active += 1
+        try:
+            return fn(*args)
+        finally:
+            with self._cond:
+                self.active -= 1
+                self.completed += 1
+                self._cond.notify_all()
+
+    def set_limit(self, limit: int):
+        with self._cond:
+            self.limit = max(self.minimum, min(limit, self.maximum))
+            self.peak = max(self.peak, self.limit)
+            self._cond.notify_all()
+
+    def adapt(self, count: int, elapsed: float):
+        """
+        One hill-climbing step. `count` is the lane's running throughput
+        counter (bytes received); its growth over `elapsed` seconds is the
+        rate being maximised.
+        """
+        rate = (count - self._last_count) / elapsed
+        self._last_count = count
+        previous, self._last_rate = self._last_rate, rate
+        if self.fixed or previous is None or not (rate or previous):
+            return
+
+        if self._hold:
+            self._hold -= 1
+            if not self._hold:
+                self._direction = 1
+            return
+
+        if rate > previous * (1 + ADAPT_TOLERANCE):
+            pass                                    # keep going
+        elif rate < previous * (1 - ADAPT_TOLERANCE):
+            self._direction = -self._direction      # went too far
+        elif self._direction > 0:
+            # Growing stopped paying off: the previous size was the knee.
+            self.set_limit(self.limit - 1)
+            self._hold = ADAPT_HOLD
+            return
+        else:
+            self._hold = ADAPT_HOLD
+            return
+
+        if self._direction > 0 and self.queued == 0:
+            return                                  # nothing waiting for a worker
+        step = max(1, self.limit // 4)
+        self.set_limit(self.limit + self._direction * step)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+_LANE_SIZES = {"zip": (ZIP_WORKERS, "DEPOSITORY_ZIP_WORKERS"),
+               "git": (GIT_WORKERS, "DEPOSITORY_GIT_WORKERS")}
+_pinned: dict[str, int] = {}
+
+
+def _fixed_workers(name: str) -> int | None:
+    return _pinned.get(name) or _env_workers(_LANE_SIZES[name][1])
+
+
+def _lanes() -> dict[str, Lane]:
+    return {name: Lane(name, *sizes, fixed=_fixed_workers(name))
+            for name, (sizes, _) in _LANE_SIZES.items()}
+
+
+def pin_workers(lane: str, workers: int | None):
+    """Fix a lane's worker count for later runs (None restores tuning)."""
+    if workers:
+        _pinned[lane] = workers
+    else:
+        _pinned.pop(lane, None)
+
+
+def lane_for(method: str) -> str:
+    """Name of the lane a download method runs in."""
+    return "git" if method == "git" else "zip"
+
+
+def group_jobs(jobs: list[tuple]) -> list[tuple]:
+    """
+    Merge git jobs for the same repository and clone profile into one task
+    so their branches share a single fetch. ZIP and extract jobs stay one
+    task per branch. `jobs` are (username, repo_name, branch, method, sha,
+    profile) tuples; returns (username, repo_name, [(branch, sha), ...],
+    method, profile) tuples.
+    """
+    tasks = []
+    git_tasks = {}
+    for user, repo, branch, method, sha, profile in jobs:
+        key = (user, repo, profile)
+        if method != "git":
+            tasks.append((user, repo, [(branch, sha)], method, profile))
+        elif key in git_tasks:
+            git_tasks[key][2].append((branch, sha))
+        else:
+            git_tasks[key] = (user, repo, [(branch, sha)], method, profile)
+            tasks.append(git_tasks[key])
+    return tasks
+
+
+def max_workers() -> int:
+    """Most threads a run can have downloading at once, across lanes."""
+    return sum(_fixed_workers(name) or sizes[2]
+               for name, (sizes, _) in _LANE_SIZES.items())
+
+
+def git_workers() -> int:
+    """Starting clone concurrency, for engines that do not tune it."""
+    return _fixed_workers("git") or GIT_WORKERS[0]
+
+
+# ──────────────────────────────────────────────
+# Job ordering
+# ──────────────────────────────────────────────
+
+def _format_duration(seconds: float) -> str:
+    if seconds < 10:
+        return f"{seconds:.1f}s"
+    seconds = round(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    return f"{seconds // 60}m {seconds % 60:02d}s"
+
+
+def _estimate(task: tuple, sizes: dict, timings: dict) -> float:
+    """Expected seconds for one task on one worker."""
+    user, repo, branches, method, _ = task
+    past = timings["jobs"].get(f"{user}/{repo}", {}).get(method)
+    if past is not None:
+        return past * len(branches)
+    rate = timings["rates"].get(method) or DEFAULT_RATES.get(method, DEFAULT_RATES["zip"])
+    size = sizes.get(repo, 0) * 1024
+    # Branches of one git task share a single fetch.
+    transfers = 1 if method == "git" else len(branches)
+    return len(branches) * JOB_OVERHEAD + transfers * size / rate
+
+
+def _plan(tasks: list[tuple], sizes: dict, timings: dict) -> list[tuple]:
+    """(task, estimate) pairs, longest first."""
+    planned = [(task, _estimate(task, sizes, timings)) for task in tasks]
+    planned.sort(key=lambda item: item[1], reverse=True)
+    return planned
+
+
+def _predict(planned: list[tuple], lanes: dict[str, Lane]) -> float:
+    """Makespan of the plan when each lane keeps its starting worker count."""
+    makespan = 0.0
+    for name, lane in lanes.items():
+        workers = [0.0] * lane.limit
+        for task, estimate in planned:
+            if lane_for(task[3]) == name:
+                heapq.heappush(workers, heapq.heappop(workers) + estimate)
+        makespan = max(makespan, max(workers))
+    return makespan
+
+
+def _record(timings: dict, finished: list[tuple], sizes: dict):
+    """Fold the durations of successful tasks into `timings` and save it."""
+    jobs, rates = timings["jobs"], timings["rates"]
+    for (user, repo, branches, method, _), seconds in finished:
+        key = f"{user}/{repo}"
+        entry = jobs.pop(key, {})
+        entry[method] = round(seconds / len(branches), 2)
+        jobs[key] = entry  # re-insert so save_timings keeps it
+        size = sizes.get(repo, 0) * 1024
+        if size and seconds >= MIN_RATE_SAMPLE:
+            transfers = 1 if method == "git" else len(branches)
+            observed = transfers * size / seconds
+            previous = rates.get(method)
+            rates[method] = (observed if previous is None else
+                             previous + RATE_SMOOTHING * (observed - previous))
+    cache.save_timings(timings)
+
+
+# ──────────────────────────────────────────────
+# Submodules
+# ──────────────────────────────────────────────
+
+class SubmoduleJobs:
+    """
+    Submodules found in finished clones, run as extra jobs in the same
+    pool through `submit` (Lane.submit or an executor's submit). One job
+    per (url, commit): a submodule pinned at the same commit by several
+    repositories or branches is fetched once and checked out in each of
+    them. Nested submodules are added as their parents finish.
+    `dest_folder` is the run's output folder.
+    """
+
+    def __init__(self, submit, dest_folder: str, board=None):
+        self._submit = submit
+        self._dest_folder = dest_folder
+        self._board = board
+        self._lock = threading.Lock()
+        self._waiting: dict[tuple, list] = {}  # (url, commit) -> [(folder, owner)]
+        self._futures = []
+
+    def add_clone(self, task: tuple, outcome: dict):
+        """Queue the submodules of the branches a git task cloned."""
+        user, repo, branches, method, profile = task
+        if method != "git" or profile is None or not profile.submodules:
+            return
+        for branch, _ in branches:
+            if outcome.get(branch):
+                self._add(core.branch_submodules(user, repo, branch, self._dest_folder),
+                          (repo, branch), profile)
+
+    def _add(self, found: list[tuple], owner: tuple, profile):
+        for url, commit, folder in found:
+            key = (url, commit)
+            with self._lock:
+                if key in self._waiting:        # queued, not started yet
+                    self._waiting[key].append((folder, owner))
+                    continue
+                self._waiting[key] = [(folder, owner)]
+                self._futures.append(self._submit(self._run, key, profile))
+            if self._board is not None:
+                self._board.add_jobs()
+
+    def _run(self, key: tuple, profile) -> tuple[bool, list]:
+        url, commit = key
+        with self._lock:
+            targets = self._waiting.pop(key)
+        with metrics.job("", url, [commit[:7]], "submodule") as job:
+            ok = core.fetch_submodule(url, commit, [f for f, _ in targets],
+                                      self._dest_folder, profile)
+            job.finish(ok)
+        if ok:
+            for folder, owner in targets:
+                self._add(core.find_submodules(folder, url), owner, profile)
+        return ok, [owner for _, owner in targets]
+
+    def results(self):
+        """
+        Wait for every submodule job, including those added while waiting,
+        yielding (ok, [(repo_name, branch), ...] whose clones it belongs to).
+        """
+        done = 0
+        while True:
+            with self._lock:
+                pending = self._futures[done:]
+            if not pending:
+                return
+            for future in pending:
+                try:
+                    ok, owners = future.result()
+                except Exception as exc:
+                    print(f"  [x]  Submodule job — exception: {exc}")
+                    ok, owners = False, []
+                if self._board is not None:
+                    self._board.job_done(ok)
+                yield ok, owners
+            done += len(pending)
+
+
+# ──────────────────────────────────────────────
+# Execution
+# ──────────────────────────────────────────────
+
+def _execute(lanes: dict[str, Lane], tasks) -> tuple[dict, list, float | None]:
+    """
+    Submit every task from the iterable `tasks` to its lane as soon as it
+    is produced, and wait for all of them. Returns ({(repo_name, branch):
+    ok}, [(task, seconds)] of fully successful tasks, seconds until the
+    first task was submitted).
+    """
+    stop = threading.Event()
+
+    def tune():
+        while not stop.wait(ADAPT_INTERVAL):
+            lanes["zip"].adapt(archive.bytes_downloaded(), ADAPT_INTERVAL)
+            limit = lanes["git"].limit
+            lanes["git"].adapt(gitops.bytes_received(), ADAPT_INTERVAL)
+            if lanes["git"].limit != limit:
+                gitops.tune(lanes["git"].limit)
+
+    # Git's own threads (checkout, index-pack) share the cores between
+    # however many clones the git lane runs at once.
+    gitops.tune(lanes["git"].limit)
+    lanes["zip"]._last_count = archive.bytes_downloaded()
+    lanes["git"]._last_count = gitops.bytes_received()
+    tuner = threading.Thread(target=tune, name="lane-tuner", daemon=True)
+    tuner.start()
+
+    def timed(task: tuple) -> tuple[dict, float]:
+        user, repo, branches, method, _ = task
+        with metrics.job(user, repo, [b for b, _ in branches], method) as job:
+            outcome = core.do_download_branches(*task)
+            job.finish(all(outcome.get(b) for b, _ in branches))
+        submodules.add_clone(task, outcome)
+        return outcome, job.seconds
+
+    results = {}
+    finished = []
+    first_submit = None
+    started = time.monotonic()
+    try:
+        with progress.Dashboard(lanes, LANE_TITLES) as board:
+            submodules = SubmoduleJobs(lanes["git"].submit, core.OUTPUT_DIR, board)
+            future_to_task = {}
+            for task in tasks:
+                if first_submit is None:
+                    first_submit = time.monotonic() - started
+                board.add_jobs()
+                future_to_task[lanes[lane_for(task[3])].submit(timed, task)] = task
+            for future in as_completed(future_to_task):
+                task = future_to_task[future]
+                _, repo_name, branches, _, _ = task
+                try:
+                    outcome, seconds = future.result()
+                except Exception as exc:
+                    names = ", ".join(branch for branch, _ in branches)
+                    print(f"  [x]  {repo_name} [{names}] — exception: {exc}")
+                    outcome = {}
+                ok = all(outcome.get(branch) for branch, _ in branches)
+                if ok:
+                    finished.append((task, seconds))
+                board.job_done(ok)
+                for branch, _ in branches:
+                    results[(repo_name, branch)] = outcome.get(branch, False)
+            # A clone is only complete once its submodules are.
+            for ok, owners in submodules.results():
+                for owner in owners:
+                    results[owner] = results[owner] and ok
+    finally:
+        stop.set()
+        tuner.join()
+        for lane in lanes.values():
+            lane.shutdown()
+        gitops.tune(None)
+    return results, finished, first_submit
+
+
+def _lane_notes(lanes: dict[str, Lane]) -> list[str]:
+    return [f"{LANE_TITLES[name]} lane settled at {lane.limit} "
+            f"worker(s) (peak {lane.peak})."
+            for name, lane in lanes.items() if lane.completed and not lane.fixed]
+
+
+# ──────────────────────────────────────────────
+# Public API
+# ──────────────────────────────────────────────
+
+def plan_run(tasks: list[tuple], sizes: dict,
+             lanes: dict) -> tuple[list[tuple], float, dict]:
+    """
+    Order `tasks` longest expected first and print the estimated time
+    with each of `lanes` at its starting limit. Returns (ordered tasks,
+    estimated seconds, timings to hand to finish_run).
+    """
+    timings = cache.load_timings()
+    planned = _plan(tasks, sizes, timings)
+    predicted = _predict(planned, lanes)
+    print(f"  Estimated time: ~{_format_duration(predicted)}\n")
+    return [task for task, _ in planned], predicted, timings
+
+
+def finish_run(timings: dict, finished: list[tuple], sizes: dict, lanes: dict,
+               notes: list[str] | None, seconds: float, predicted: float):
+    """
+    Record the [(task, seconds)] of `finished` tasks and add the run's
+    summary lines (actual vs. estimated time, lane sizes) to `notes`.
+    """
+    _record(timings, finished, sizes)
+    if notes is not None:
+        notes.append(f"Finished in {_format_duration(seconds)} "
+                     f"(estimated {_format_duration(predicted)}).")
+        notes.extend(_lane_notes(lanes))
+
+
+def run_tasks(tasks: list[tuple], sizes: dict | None = None,
+              notes: list[str] | None = None) -> dict[tuple, bool]:
+    """
+    Run (username, repo_name, [(branch, sha), ...], method, profile)
+    tasks in their lanes, longest expected first, tuning each lane's
+    concurrency as the run goes. `sizes` maps repo names to the API's
+    `size` field (KB). Lines for the run summary (actual vs. estimated
+    time, lane sizes) are appended to `notes`.
+    Returns {(repo_name, branch): ok}.
+    """
+    sizes = sizes or {}
+    lanes = _lanes()
+    tasks, predicted, timings = plan_run(tasks, sizes, lanes)
+
+    started = time.monotonic()
+    results, finished, _ = _execute(lanes, tasks)
+    finish_run(timings, finished, sizes, lanes, notes,
+               time.monotonic() - started, predicted)
+    return results
+
+
+def run_stream(tasks, sizes: dict | None = None,
+               notes: list[str] | None = None) -> dict[tuple, bool]:
+    """
+    Like run_tasks, for tasks that are still being discovered: each task
+    from the iterable `tasks` starts as soon as it is produced, in arrival
+    order. `sizes` may be filled in by the producer as it goes.
+    """
+    sizes = sizes if sizes is not None else {}
+    lanes = _lanes()
+    timings = cache.load_timings()
+
+    started = time.monotonic()
+    results, finished, first_submit = _execute(lanes, tasks)
+    _record(timings, finished, sizes)
+    if notes is not None:
+        if first_submit is not None:
+            notes.append(f"First download started after "
+                         f"{_format_duration(first_submit)}.")
+        notes.append(f"Finished in {_format_duration(time.monotonic() - started)}.")
+        notes.extend(_lane_notes(lanes))
+    return results
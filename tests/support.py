@@ -0,0 +1,24 @@
+"""
+Shared test setup: import paths, and a scratch cache / report folder so
+tests never touch ~/.depository_cache. Import before any depository module.
+"""
+
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+TMP = tempfile.mkdtemp(prefix="depository-test-")
+atexit.register(shutil.rmtree, TMP, ignore_errors=True)
+os.environ.update({
+    "DEPOSITORY_CACHE_DIR": os.path.join(TMP, "cache"),
+    "DEPOSITORY_REPORT_DIR": os.path.join(TMP, "reports"),
+    "DEPOSITORY_ARCHIVE_CACHE": "0",
+    "GITHUB_TOKEN_DEPOSITORY": "",
+})
@@ -0,0 +1,64 @@
+"""Resumable and segmented archive downloads against the fake GitHub."""
+
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from support import ROOT, TMP
+
+import depository_archive as archive
+from fake_github import FakeGitHub
+
+
+class SegmentedDownloadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeGitHub(repos=1, latency=0, archive_size=1 << 20).start()
+        self.url = f"{self.fake.web_url}/o/repo/archive/main.zip"
+        self.path = os.path.join(tempfile.mkdtemp(dir=TMP), "repo-main.zip")
+        self.saved = archive.SEGMENT_THRESHOLD, archive.STATE_FLUSH_BYTES
+        archive.SEGMENT_THRESHOLD = 256 << 10
+        archive.STATE_FLUSH_BYTES = 64 << 10
+        archive.progress_bars = False
+
+    def tearDown(self):
+        archive.SEGMENT_THRESHOLD, archive.STATE_FLUSH_BYTES = self.saved
+        self.fake.stop()
+
+    def _fetch(self) -> bytes:
+        with contextlib.redirect_stderr(io.StringIO()):
+            archive.fetch_archive(self.url, self.path)
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def test_segmented(self):
+        self.assertEqual(self._fetch(), self.fake.zip_blob)
+
+    def test_weak_etag_is_one_stream(self):
+        self.fake.weak_etags = True
+        self.assertFalse(archive.wants_segments(200, {"ETag": 'W/"x"',
+                                                      "Accept-Ranges": "bytes"}, 1 << 30))
+        self.assertEqual(self._fetch(), self.fake.zip_blob)
+
+    def test_ranges_ignored_falls_back_to_one_stream(self):
+        self.fake.ranges = False
+        self.assertEqual(self._fetch(), self.fake.zip_blob)
+        self.assertFalse(os.path.exists(f"{self.path}.part.json"))
+
+
+
+class LazyImportTest(unittest.TestCase):
+
+    def test_import_leaves_requests_unloaded(self):
+        code = "import sys, depository_archive; print('requests' in sys.modules)"
+        out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True,
+                             capture_output=True, text=True).stdout
+        self.assertEqual(out.strip(), "False")
+
+
+if __name__ == "__main__":
+    unittest.main()
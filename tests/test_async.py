@@ -0,0 +1,57 @@
+"""The asyncio ZIP engine against the fake GitHub (needs aiohttp)."""
+
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+from support import TMP
+
+import depository_archive as archive
+import depository_async as aio
+import depository_core as core
+import depository_http as http
+from fake_github import FakeGitHub
+
+
+@unittest.skipUnless(aio.available(), "aiohttp is not installed")
+class AsyncZipTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeGitHub(repos=8, latency=0, archive_size=128 << 10).start()
+        self.saved = http.WEB_BASE_URL, core.OUTPUT_DIR, archive.RETRY_DELAY
+        http.WEB_BASE_URL = self.fake.web_url
+        core.OUTPUT_DIR = tempfile.mkdtemp(dir=TMP)
+        archive.RETRY_DELAY = 0.01
+
+    def tearDown(self):
+        http.WEB_BASE_URL, core.OUTPUT_DIR, archive.RETRY_DELAY = self.saved
+        self.fake.stop()
+
+    def test_downloads_with_server_errors(self):
+        self.fake.archive_failures = 3
+        tasks = [("o", f"repo{i}", [("main", None)], "zip", None) for i in range(8)]
+        with contextlib.redirect_stdout(io.StringIO()), \
+                contextlib.redirect_stderr(io.StringIO()):
+            results = aio.run_tasks(tasks, 2)
+        self.assertTrue(all(results.values()))
+        for i in range(8):
+            with open(os.path.join(core.OUTPUT_DIR, f"repo{i}-main.zip"), "rb") as f:
+                self.assertEqual(f.read(), self.fake.zip_blob)
+
+    def test_dashboard_and_notes(self):
+        tasks = [("o", f"repo{i}", [("main", None)], "zip", None) for i in range(8)]
+        notes = []
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(io.StringIO()):
+            results = aio.run_tasks(tasks, 2, {f"repo{i}": 128 for i in range(8)}, notes)
+        self.assertEqual(len(results), 8)
+        self.assertIn("Estimated time:", out.getvalue())
+        self.assertIn("Downloads 8/8", out.getvalue())
+        self.assertTrue(any(note.startswith("Finished in") and "estimated" in note
+                            for note in notes))
+
+
+if __name__ == "__main__":
+    unittest.main()
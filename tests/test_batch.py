@@ -0,0 +1,74 @@
+"""Manifest runs point core.OUTPUT_DIR at each owner only while it runs."""
+
+import contextlib
+import io
+import json
+import os
+import unittest
+
+from support import TMP
+
+import depository_batch as batch
+import depository_core as core
+import depository_pipeline as pipeline
+
+
+class RunManifestTest(unittest.TestCase):
+
+    def setUp(self):
+        self._mirror = pipeline.mirror_default_branches
+        self.addCleanup(setattr, pipeline, "mirror_default_branches", self._mirror)
+        self.addCleanup(setattr, core, "OUTPUT_DIR", core.OUTPUT_DIR)
+        core.OUTPUT_DIR = "output"
+        self.seen = []
+
+    def _manifest(self, *owners: str) -> dict:
+        path = os.path.join(TMP, "manifest.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"output": os.path.join(TMP, "batch"), "layout": "owner",
+                       "targets": list(owners)}, f)
+        return batch.load_manifest(path)
+
+    def _mirror_stub(self, owner, method, notes, **kwargs):
+        self.seen.append(core.OUTPUT_DIR)
+        if owner == "broken":
+            raise RuntimeError("target failed")
+        if owner == "unlisted":
+            return {(owner, core.LISTING): False}
+        return {("repo", "main"): True}
+
+    def test_output_dir_per_owner_then_restored(self):
+        pipeline.mirror_default_branches = self._mirror_stub
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = batch.run_manifest(self._manifest("alice", "bob"))
+
+        root = os.path.join(TMP, "batch")
+        self.assertEqual(self.seen, [os.path.join(root, "alice"), os.path.join(root, "bob")])
+        self.assertEqual(set(results), {("alice/repo", "main"), ("bob/repo", "main")})
+        self.assertEqual(core.OUTPUT_DIR, "output")
+
+    def test_output_dir_restored_after_failure(self):
+        pipeline.mirror_default_branches = self._mirror_stub
+        with contextlib.redirect_stdout(io.StringIO()), self.assertRaises(RuntimeError):
+            batch.run_manifest(self._manifest("broken"))
+        self.assertEqual(core.OUTPUT_DIR, "output")
+
+    def test_unlisted_owner_fails_the_run(self):
+        pipeline.mirror_default_branches = self._mirror_stub
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = batch.run_manifest(self._manifest("alice", "unlisted"))
+        self.assertTrue(results[("alice/repo", "main")])
+        self.assertFalse(results[("unlisted", core.LISTING)])
+
+    def test_selected_branches_without_listing(self):
+        self.addCleanup(setattr, core, "get_repos", core.get_repos)
+        core.get_repos = lambda owner: None
+        manifest = self._manifest("alice")
+        manifest["targets"][0]["branches"] = "all"
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = batch.run_manifest(manifest)
+        self.assertEqual(results, {("alice", core.LISTING): False})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+"""The archive store is trimmed per stored volume, not per archive."""
+
+import os
+import tempfile
+import unittest
+
+from support import TMP
+
+import depository_cache as cache
+
+
+class ArchiveStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        saved = (cache.ARCHIVE_CACHE_ENABLED, cache.ARCHIVE_CACHE_DIR,
+                 cache.ARCHIVE_CACHE_PRUNE_BYTES, cache.prune_archive_cache)
+
+        def restore():
+            (cache.ARCHIVE_CACHE_ENABLED, cache.ARCHIVE_CACHE_DIR,
+             cache.ARCHIVE_CACHE_PRUNE_BYTES, cache.prune_archive_cache) = saved
+            cache._archive_bytes_since_prune = 0
+        self.addCleanup(restore)
+
+        self.work = tempfile.mkdtemp(dir=TMP)
+        cache.ARCHIVE_CACHE_ENABLED = True
+        cache.ARCHIVE_CACHE_DIR = os.path.join(self.work, "archives")
+        cache.ARCHIVE_CACHE_PRUNE_BYTES = 2500
+        cache._archive_bytes_since_prune = 0
+        self.prunes = 0
+        cache.prune_archive_cache = self._count_prune
+
+    def _count_prune(self):
+        self.prunes += 1
+
+    def _store(self, key: str):
+        src = os.path.join(self.work, f"{key}.zip")
+        with open(src, "wb") as f:
+            f.write(b"x" * 1000)
+        cache.store_archive(key, src)
+
+    def test_prunes_after_threshold(self):
+        for key in ("a1", "b2"):
+            self._store(key)
+        self.assertEqual(self.prunes, 0)
+        self._store("c3")
+        self.assertEqual(self.prunes, 1)
+        self.assertTrue(cache.restore_archive("a1", os.path.join(self.work, "out.zip")))
+
+    def test_prunes_leftovers_at_exit(self):
+        self._store("a1")
+        cache._prune_stored_archives()
+        self.assertEqual(self.prunes, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+"""Streamed tarball extraction, including archives that try to escape."""
+
+import io
+import os
+import tarfile
+import tempfile
+import unittest
+
+from support import TMP
+
+import depository_archive as archive
+from fake_github import FakeGitHub
+
+
+def _tarball(members: list[tuple]) -> bytes:
+    """members: ("file", name, data), ("dir", name) or ("link", name, target)."""
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz") as tar:
+        for kind, name, *rest in members:
+            info = tarfile.TarInfo(f"repo-main/{name}")
+            if kind == "file":
+                info.size = len(rest[0])
+                tar.addfile(info, io.BytesIO(rest[0]))
+                continue
+            if kind == "dir":
+                info.type = tarfile.DIRTYPE
+            else:
+                info.type = tarfile.SYMTYPE
+                info.linkname = rest[0]
+            tar.addfile(info)
+    return buf.getvalue()
+
+
+class ExtractTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeGitHub(repos=1, latency=0).start()
+        self.base = tempfile.mkdtemp(dir=TMP)
+        self.dest = os.path.join(self.base, "out", "repo-main")
+        archive.progress_bars = False
+
+    def tearDown(self):
+        self.fake.stop()
+
+    def _extract(self, members: list[tuple]):
+        self.fake.tar_blob = _tarball(members)
+        archive.extract_archive(f"{self.fake.web_url}/o/repo/archive/main.tar.gz",
+                                self.dest)
+
+    def _escaped(self) -> list[str]:
+        found = []
+        for folder, _, files in os.walk(self.base):
+            if not os.path.realpath(folder).startswith(os.path.realpath(self.dest)):
+                found += [name for name in files if name.startswith("ESCAPED")]
+        return found
+
+    def test_plain_tree(self):
+        self._extract([("dir", "src"), ("file", "src/a.txt", b"a"),
+                       ("link", "b.txt", "src/a.txt")])
+        with open(os.path.join(self.dest, "b.txt"), "rb") as f:
+            self.assertEqual(f.read(), b"a")
+
+    def test_symlink_chain(self):
+        self._extract([("dir", "d"), ("link", "d/y", ".."), ("link", "x", "d/y/.."),
+                       ("file", "x/ESCAPED.txt", b"!"), ("file", "ok.txt", b"ok")])
+        self.assertEqual(self._escaped(), [])
+        self.assertTrue(os.path.isfile(os.path.join(self.dest, "ok.txt")))
+
+    def test_link_rerouted_by_a_later_link(self):
+        self._extract([("link", "a", "b/c/.."), ("dir", "b"), ("link", "b/c", ".."),
+                       ("file", "a/ESCAPED2.txt", b"!"), ("link", "abs", "/etc"),
+                       ("link", "up", "../../..")])
+        self.assertEqual(self._escaped(), [])
+        for name in ("a", "abs", "up"):
+            self.assertFalse(os.path.lexists(os.path.join(self.dest, name)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+"""GraphQL error handling, with canned responses instead of the network."""
+
+import contextlib
+import io
+import json
+import unittest
+
+import support  # noqa: F401  (paths and scratch cache first)
+
+import depository_core as core
+import depository_graphql as graphql
+import depository_http as http
+import requests
+
+
+def _response(body, headers: dict | None = None) -> requests.Response:
+    resp = requests.Response()
+    resp.status_code = 200
+    resp._content = body if isinstance(body, bytes) else json.dumps(body).encode()
+    resp.headers.update(headers or {})
+    return resp
+
+
+def _refs(*names: str) -> dict:
+    return {"refs": {"pageInfo": {"hasNextPage": False, "endCursor": None},
+                     "nodes": [{"name": n, "target": {"oid": "0" * 40}} for n in names]}}
+
+
+class GraphQLTest(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = http.request, http.GITHUB_TOKEN
+        http.GITHUB_TOKEN = "test"
+        self.responses = []
+        http.request = lambda *args, **kwargs: self.responses.pop(0)
+
+    def tearDown(self):
+        http.request, http.GITHUB_TOKEN = self.saved
+        graphql._listed_branches.clear()
+
+    def _bulk(self, names: list[str]):
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            result = graphql.get_branches_bulk("o", names)
+        return result, out.getvalue()
+
+    def test_missing_repository_is_none(self):
+        self.responses = [_response({
+            "data": {"r0": _refs("main"), "r1": None},
+            "errors": [{"type": "NOT_FOUND", "path": ["r1"], "message": "nope"}]})]
+        result, _ = self._bulk(["a", "gone"])
+        self.assertEqual([b["name"] for b in result["a"]], ["main"])
+        self.assertIsNone(result["gone"])
+
+    def test_rate_limited_is_retried(self):
+        self.responses = [
+            _response({"data": None, "errors": [{"type": "RATE_LIMITED",
+                                                 "message": "limit"}]},
+                      {"Retry-After": "0"}),
+            _response({"data": {"r0": _refs("main", "dev")}}),
+        ]
+        result, _ = self._bulk(["a"])
+        self.assertEqual([b["name"] for b in result["a"]], ["main", "dev"])
+
+    def test_failures_are_reported(self):
+        for body in (b"<html>bad gateway</html>", {"data": None},
+                     {"data": {"r0": None}, "errors": [{"type": "INTERNAL",
+                                                        "message": "boom"}]}):
+            self.responses = [_response(body)]
+            result, out = self._bulk(["a"])
+            self.assertIsNone(result)           # callers fall back to REST
+            self.assertIn("GraphQL query failed", out)
+
+    def _listing(self, *names: str, more: bool = False, after: str | None = None) -> dict:
+        nodes = [{"name": name, "description": None, "diskUsage": 12,
+                  "isFork": False, "defaultBranchRef": {"name": "main"},
+                  **_refs("main")} for name in names]
+        return {"data": {"repositoryOwner": {"repositories": {
+            "pageInfo": {"hasNextPage": more, "endCursor": after}, "nodes": nodes}}}}
+
+    def test_listing_brings_branches_along(self):
+        self.responses = [_response(self._listing("a", more=True, after="c1")),
+                          _response(self._listing("b"))]
+        with contextlib.redirect_stdout(io.StringIO()):
+            repos = core.get_repos("o")
+        self.assertEqual([r["name"] for r in repos], ["a", "b"])
+        self.assertEqual((repos[0]["default_branch"], repos[0]["size"]), ("main", 12))
+        # Both branch lists came with the listing: no further query.
+        result, _ = self._bulk(["a", "b"])
+        self.assertEqual({n: [b["name"] for b in result[n]] for n in result},
+                         {"a": ["main"], "b": ["main"]})
+        self.assertEqual(self.responses, [])
+
+    def test_unknown_owner_falls_back_to_rest(self):
+        self.responses = [_response({"data": {"repositoryOwner": None}})]
+        self.assertIsNone(graphql.get_repos("nobody"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+"""Repository listings against the local fake GitHub API."""
+
+import contextlib
+import io
+import unittest
+
+import support  # noqa: F401  (paths and scratch cache first)
+
+import depository_core as core
+import depository_http as http
+from fake_github import FakeGitHub
+
+
+class ListingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeGitHub(repos=250, latency=0).start()
+        self.saved = http.API_BASE_URL
+        http.API_BASE_URL = self.fake.api_url
+
+    def tearDown(self):
+        http.API_BASE_URL = self.saved
+        self.fake.stop()
+
+    def _names(self) -> list[str]:
+        with contextlib.redirect_stdout(io.StringIO()):
+            repos = core.get_repos("grow")
+        return [repo["name"] for repo in repos]
+
+    def test_all_pages(self):
+        self.assertEqual(len(self._names()), 250)
+
+    def test_grown_listing_after_cached_first_page(self):
+        self.assertEqual(len(self._names()), 250)
+        # Page 1 is unchanged (304 from the cache); the listing is longer.
+        self.fake.repos = 350
+        names = self._names()
+        self.assertEqual(len(names), 350)
+        self.assertEqual(len(set(names)), 350)
+
+    def test_listing_grows_during_the_walk(self):
+        # Page 1 said there were 3 pages; by the time page 3 is fetched
+        # it is full, so the walk has to go on.
+        self.fake.repos = 350
+        last_page = core._last_page
+        core._last_page = lambda resp: 3
+        try:
+            self.assertEqual(len(self._names()), 350)
+        finally:
+            core._last_page = last_page
+
+
+if __name__ == "__main__":
+    unittest.main()
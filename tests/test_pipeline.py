@@ -0,0 +1,61 @@
+"""Listing and resolve failures in a streaming mirror run are reported."""
+
+import contextlib
+import io
+import unittest
+
+import support  # noqa: F401  (paths and scratch cache first)
+
+import depository_core as core
+import depository_pipeline as pipeline
+import depository_scheduler as scheduler
+
+
+def _repos(*names: str) -> list[dict]:
+    return [{"name": name, "default_branch": "main", "size": 1} for name in names]
+
+
+class MirrorTest(unittest.TestCase):
+
+    def setUp(self):
+        for module, name in ((core, "iter_repos"), (core, "get_branch"),
+                             (scheduler, "run_stream")):
+            self.addCleanup(setattr, module, name, getattr(module, name))
+        core.get_branch = self._branch
+        scheduler.run_stream = lambda tasks, sizes, notes: {
+            (repo, branches[0][0]): True for _, repo, branches, _, _ in tasks}
+
+    @staticmethod
+    def _branch(username, repo, branch):
+        if repo == "broken":
+            raise ValueError("bad payload")
+        return {"name": branch, "commit": {"sha": "0" * 40}}
+
+    def _mirror(self) -> dict:
+        with contextlib.redirect_stdout(io.StringIO()):
+            return pipeline.mirror_default_branches("alice", "zip")
+
+    def test_complete_listing(self):
+        core.iter_repos = lambda username: iter([_repos("a", "b")])
+        self.assertEqual(self._mirror(), {("a", "main"): True, ("b", "main"): True})
+
+    def test_page_failure_is_a_failed_result(self):
+        core.iter_repos = lambda username: iter([_repos("a"), None])
+        results = self._mirror()
+        self.assertTrue(results[("a", "main")])
+        self.assertFalse(results[("alice", core.LISTING)])
+        self.assertFalse(all(results.values()))
+
+    def test_listing_failure_is_not_an_empty_success(self):
+        core.iter_repos = lambda username: iter([None])
+        self.assertEqual(self._mirror(), {("alice", core.LISTING): False})
+
+    def test_resolve_exception_fails_the_repository(self):
+        core.iter_repos = lambda username: iter([_repos("a", "broken")])
+        results = self._mirror()
+        self.assertTrue(results[("a", "main")])
+        self.assertFalse(results[("broken", "main")])
+
+
+if __name__ == "__main__":
+    unittest.main()
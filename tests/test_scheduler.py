@@ -0,0 +1,37 @@
+"""The git lane is tuned on the bytes git reports, not on finished jobs."""
+
+import unittest
+
+import support  # noqa: F401  (paths and scratch cache first)
+
+import depository_git as gitops
+import depository_progress as progress
+import depository_scheduler as scheduler
+from git import RemoteProgress
+
+
+class GitLaneTest(unittest.TestCase):
+
+    def test_clone_progress_counts_received_bytes(self):
+        board = progress.Dashboard({}, {})
+        before = gitops.bytes_received()
+        clone = board._clone_progress("repo [main]")
+        receiving = RemoteProgress.RECEIVING
+        clone.update(receiving, 10, 100, ", 1.00 MiB | 1.00 MiB/s")
+        clone.update(receiving, 50, 100, ", 3.00 MiB | 2.00 MiB/s")
+        clone.close()
+        self.assertEqual(gitops.bytes_received() - before, 3 * 1024 ** 2)
+
+    def test_git_lane_follows_byte_rate(self):
+        lane = scheduler.Lane("git", 2, 1, 8)
+        self.addCleanup(lane.shutdown)
+        lane.queued = 10  # work waiting for a worker
+        received = 0
+        for rate in (1, 2, 4):
+            received += rate * 1024 ** 2
+            lane.adapt(received, scheduler.ADAPT_INTERVAL)
+        self.assertGreater(lane.limit, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+"""
+Submodule jobs: clone a repository with a (nested) submodule through a
+local git http-backend, twice, into a relative output folder.
+"""
+
+import contextlib
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from support import TMP
+
+import depository_core as core
+import depository_git as gitops
+import depository_http as http
+import depository_scheduler as scheduler
+from fake_github import FakeGitHub
+
+GIT = ["git", "-c", "user.name=test", "-c", "user.email=test@example.invalid",
+       "-c", "protocol.file.allow=always"]
+
+
+def _make_repo(root: str, work: str, name: str, submodules=()) -> str:
+    """Bare repository root/o/<name>.git; `submodules` are (path, url, relative url)."""
+    folder = os.path.join(work, name)
+    subprocess.run(["git", "init", "-q", "-b", "main", folder], check=True)
+    with open(os.path.join(folder, "f.txt"), "w", encoding="utf-8") as f:
+        f.write(name)
+    for path, url, relative in submodules:
+        subprocess.run(GIT + ["-C", folder, "submodule", "add", "-q", url, path], check=True)
+        subprocess.run(["git", "-C", folder, "config", "-f", ".gitmodules",
+                        f"submodule.{path}.url", relative], check=True)
+    subprocess.run(GIT + ["-C", folder, "add", "-A"], check=True)
+    subprocess.run(GIT + ["-C", folder, "commit", "-qm", "fixture"], check=True)
+    bare = os.path.join(root, "o", f"{name}.git")
+    subprocess.run(["git", "clone", "-q", "--bare", folder, bare], check=True)
+    return bare
+
+
+@unittest.skipIf(shutil.which("git") is None, "git is not installed")
+class SubmoduleTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp(dir=TMP)
+        root = os.path.join(cls.tmp, "git")
+        work = os.path.join(cls.tmp, "work")
+        inner = _make_repo(root, work, "inner")
+        lib = _make_repo(root, work, "lib", [("deps/inner", inner, "../inner.git")])
+        _make_repo(root, work, "app", [("vendor/lib", lib, "../lib.git")])
+        cls.fake = FakeGitHub(repos=1, latency=0, git_root=root).start()
+        cls.saved = (http.WEB_BASE_URL, core.OUTPUT_DIR, os.getcwd())
+        http.WEB_BASE_URL = cls.fake.web_url
+        os.chdir(cls.tmp)
+        core.OUTPUT_DIR = "output"              # relative, like the default
+
+    @classmethod
+    def tearDownClass(cls):
+        http.WEB_BASE_URL, core.OUTPUT_DIR, cwd = cls.saved
+        os.chdir(cwd)
+        cls.fake.stop()
+        shutil.rmtree(cls.tmp, ignore_errors=True)
+
+    def _run(self) -> dict:
+        profile = gitops.make_profile(submodules=True)
+        with contextlib.redirect_stdout(io.StringIO()):
+            return scheduler.run_tasks([("o", "app", [("main", None)], "git", profile)])
+
+    def test_clone_twice(self):
+        for _ in range(2):
+            self.assertEqual(self._run(), {("app", "main"): True})
+            checkout = os.path.join(self.tmp, "output", "app-main")
+            with open(os.path.join(checkout, "vendor", "lib", "f.txt"), encoding="utf-8") as f:
+                self.assertEqual(f.read(), "lib")
+            with open(os.path.join(checkout, "vendor", "lib", "deps", "inner", "f.txt"),
+                      encoding="utf-8") as f:
+                self.assertEqual(f.read(), "inner")
+        stores = os.path.join(self.tmp, "output", ".depository", "submodules")
+        for store in os.listdir(stores):
+            self.assertFalse(os.path.exists(os.path.join(stores, store, "output")))
+
+
+if __name__ == "__main__":
+    unittest.main()